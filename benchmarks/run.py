@@ -0,0 +1,220 @@
+"""
+Benchmarks of the game engine on synthetic seasons (see synthetic.py)
+of several sizes. The timings are written as JSON, such that results
+of different commits can be compared.
+
+Example:
+    python benchmarks/run.py --scales small medium --output results.json
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "game"))
+
+import season_data
+from season_data import load_season
+from synthetic import make_season
+
+
+SEASON = "2020-21"
+
+# players per club of every scale, with 20 clubs
+SCALES = {"small": 15, "medium": 30, "large": 60}
+
+
+def measure(run, setup=None, repeat=5):
+    """Time run, calling setup (untimed) before every repetition
+
+    Returns:
+    --------
+    times : list
+        seconds of every repetition
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def use_root(root):
+    """Point the data root to root, and forget the loaded seasons
+    """
+    season_data.stats_dir = os.path.join(root, "")
+    load_season.cache_clear()
+
+
+def example_squad(season):
+    """Get the rows, bench, captain and vice captain of a legal squad,
+    picked by price
+    """
+    from squad_optimizer import optimize_squad
+    data = load_season(season)
+    stats, stat_index = data.gameweek_stats()
+    prices = np.rint(stats[1, :, stat_index['value']]).astype(int)
+    squad = optimize_squad(prices, prices, data.players_raw['element_type'].to_numpy(),
+                           data.players_raw['team'].to_numpy(), 1000, solver="dp")
+    return squad.squad, squad.bench, squad.captain, squad.vice_captain
+
+
+def bench_season_load(root, repeat):
+    """Parse the season files and build the gameweek statistics
+    """
+    def run():
+        season_data.SeasonData(SEASON, use_cache=False).gameweek_stats()
+    return measure(run, repeat=repeat)
+
+
+def bench_player_lookup(root, repeat):
+    """Resolve every player of the season by name
+    """
+    from players import Player
+    names = (load_season(SEASON).player_idlist['first_name'] + " "
+             + load_season(SEASON).player_idlist['second_name']).tolist()
+
+    def run():
+        for name in names:
+            player = Player(name)
+            player.get_player_position_id(SEASON)
+            player.get_team_id(SEASON)
+            player.get_gameweek_points(SEASON, 1)
+    return measure(run, repeat=repeat)
+
+
+def bench_team_validation(root, repeat):
+    """Create and validate a team
+    """
+    from environment import make_team
+    from game_rules import validate_team
+    rows, bench, captain, vice_captain = example_squad(SEASON)
+
+    def run():
+        team = make_team(SEASON, rows, bench, captain, vice_captain)
+        validate_team(team, 1000, 1)
+    return measure(run, repeat=repeat)
+
+
+def bench_season_replay(root, repeat):
+    """Play a full season with FPL, keeping the initial team
+    """
+    from environment import make_team
+    from game_rules import FPL
+    rows, bench, captain, vice_captain = example_squad(SEASON)
+    team = make_team(SEASON, rows, bench, captain, vice_captain)
+
+    def run():
+        game = FPL(team, [False, False, False, False])
+        for _ in range(FPL.GAMEWEEKS):
+            game.next_gameweek()
+    return measure(run, repeat=repeat)
+
+
+def bench_prepare_data_sets(root, repeat):
+    """Build the training windows of the season
+    """
+    from create_training_set import TrainingSet
+
+    def run():
+        TrainingSet(SEASON).prepare_data_sets()
+    return measure(run, repeat=repeat)
+
+
+def bench_squad_selection(root, repeat):
+    """Select the best squad for random expected points, with each of
+    the available solvers
+    """
+    from squad_optimizer import optimize_squad, milp
+    data = load_season(SEASON)
+    rng = np.random.default_rng(0)
+    points = rng.gamma(2, 2, len(data.players_raw))
+    args = (points, data.players_raw['now_cost'].to_numpy(), data.players_raw['element_type'].to_numpy(),
+            data.players_raw['team'].to_numpy())
+    times = {"dp": measure(lambda: optimize_squad(*args, solver="dp"), repeat=repeat)}
+    if milp is not None:
+        times["milp"] = measure(lambda: optimize_squad(*args, solver="milp"), repeat=repeat)
+    return times
+
+
+BENCHMARKS = {
+    "season_load": bench_season_load,
+    "player_lookup": bench_player_lookup,
+    "team_validation": bench_team_validation,
+    "season_replay": bench_season_replay,
+    "prepare_data_sets": bench_prepare_data_sets,
+    "squad_selection": bench_squad_selection,
+}
+
+
+def summarize(name, scale, players, times):
+    """Get the result entry of a benchmark
+    """
+    return {"benchmark": name, "scale": scale, "players": players, "repeat": len(times),
+            "min": min(times), "median": float(np.median(times)), "mean": float(np.mean(times))}
+
+
+def run_benchmarks(scales, names, repeat, data_dir):
+    """Run benchmarks on synthetic seasons, written to data_dir when
+    missing
+
+    Returns:
+    --------
+    results : list
+        one entry per benchmark and scale. Benchmarks whose
+        dependencies are missing are reported as skipped
+    """
+    results = []
+    for scale in scales:
+        root = os.path.join(data_dir, scale)
+        if not os.path.isdir(os.path.join(root, SEASON)):
+            make_season(root, SEASON, players_per_club=SCALES[scale])
+        use_root(root)
+        # the benchmarks other than season_load start from loaded data
+        load_season(SEASON).gameweek_stats()
+        players = len(load_season(SEASON).players_raw)
+        for name in names:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    times = BENCHMARKS[name](root, repeat)
+            except ImportError as error:
+                results.append({"benchmark": name, "scale": scale, "players": players,
+                                "skipped": str(error)})
+                print(f"{name:<20} {scale:<8} skipped ({error})")
+                continue
+            if not isinstance(times, dict):
+                times = {None: times}
+            for variant, variant_times in times.items():
+                entry = summarize(name if variant is None else f"{name}[{variant}]", scale, players,
+                                  variant_times)
+                results.append(entry)
+                print(f"{entry['benchmark']:<20} {scale:<8} {entry['median']:>10.4f} s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmarks")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", help="folder of the synthetic seasons, kept between runs. "
+                                           "A temporary folder by default")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        results = run_benchmarks(args.scales, args.benchmarks, args.repeat, args.data_dir or temporary)
+    with open(args.output, "w") as f:
+        json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                   "platform": platform.platform(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
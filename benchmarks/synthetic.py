@@ -0,0 +1,180 @@
+"""
+Synthetic season data with the layout of Vaastav Anand's scraper, for
+benchmarking without the real data:
+
+    <root>/<season>/teams.csv
+    <root>/<season>/player_idlist.csv
+    <root>/<season>/players_raw.csv
+    <root>/<season>/gws/gw<gameweek>.csv
+    <root>/<season>/players/<first>_<second>_<id>/gw.csv
+
+Players get a hidden quality that decides their price, how often they
+play and how many points they score, such that squad selection and
+the models see data resembling a real season.
+
+Example:
+    python synthetic.py /tmp/fpl-data --players-per-club 30
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+
+# columns of the gameweek files, as in the 2019-20 season of the scraper
+GAMEWEEK_COLUMNS = ["assists", "attempted_passes", "big_chances_created", "big_chances_missed", "bonus", "bps", "clean_sheets", "clearances_blocks_interceptions", "completed_passes", "creativity", "dribbles", "ea_index", "element", "errors_leading_to_goal", "errors_leading_to_goal_attempt", "fixture", "fouls", "goals_conceded", "goals_scored", "ict_index", "id", "influence", "key_passes", "kickoff_time", "loaned_in", "loaned_out", "minutes", "offside", "open_play_crosses", "opponent_team", "own_goals", "penalties_conceded", "penalties_missed", "penalties_saved", "recoveries", "red_cards", "round", "saves", "selected", "tackled", "tackles", "target_missed", "team_a_score", "team_h_score", "threat", "total_points", "transfers_balance", "transfers_in", "transfers_out", "value", "was_home", "winning_goals", "yellow_cards"]
+
+# share of keepers, defenders, midfielders and forwards in a club
+POSITION_SHARES = [0.1, 0.35, 0.35, 0.2]
+
+# points per goal and clean sheet of each position id (index)
+GOAL_POINTS = np.array([0, 6, 6, 5, 4])
+CLEAN_SHEET_POINTS = np.array([0, 4, 4, 1, 0])
+
+SYLLABLES = ["al", "be", "ca", "do", "el", "fi", "go", "ha", "in", "jo", "ka", "lu", "ma", "no",
+             "or", "pe", "ri", "sa", "to", "ul", "va", "wi", "xa", "yo", "ze"]
+
+
+def make_names(count, rng):
+    """Make count distinct (first name, second name) pairs
+    """
+    names = set()
+    while len(names) < count:
+        first = "".join(rng.choice(SYLLABLES, 2)).capitalize()
+        second = "".join(rng.choice(SYLLABLES, 3)).capitalize()
+        names.add((first, second))
+    names = sorted(names)
+    rng.shuffle(names)
+    return names
+
+
+def make_season(root, season="2020-21", clubs=20, players_per_club=30, gameweeks=38, seed=0):
+    """Write a synthetic season under root.
+
+    Parameters:
+    ----------
+    root : str
+        data root, see season_data.stats_dir
+    season : str
+        season name
+    clubs : int
+        number of clubs
+    players_per_club : int
+        number of players of each club
+    gameweeks : int
+        number of gameweeks
+    seed : int
+        seed of the random data
+
+    Returns:
+    --------
+    season_dir : str
+        the folder of the season
+    """
+    rng = np.random.default_rng(seed)
+    season_dir = os.path.join(root, season)
+    os.makedirs(os.path.join(season_dir, "gws"), exist_ok=True)
+    os.makedirs(os.path.join(season_dir, "players"), exist_ok=True)
+
+    club_ids = np.arange(1, clubs + 1)
+    pd.DataFrame({"id": club_ids, "code": club_ids, "name": [f"Club {i}" for i in club_ids],
+                  "short_name": [f"C{i:02d}" for i in club_ids],
+                  "strength": rng.integers(2, 6, clubs)}).to_csv(
+        os.path.join(season_dir, "teams.csv"), index=False)
+
+    # players, with at least 2 keepers, 5 defenders, 5 midfielders and
+    # 3 forwards per club
+    counts = np.maximum(np.round(np.array(POSITION_SHARES) * players_per_club).astype(int), [2, 5, 5, 3])
+    positions = np.tile(np.repeat([1, 2, 3, 4], counts), clubs)
+    teams = np.repeat(club_ids, counts.sum())
+    players = len(positions)
+    ids = np.arange(1, players + 1)
+    names = make_names(players, rng)
+    first_names = [first for first, _ in names]
+    second_names = [second for _, second in names]
+    quality = rng.lognormal(0, 0.5, players)
+    prices = np.clip(np.round(35 + 15 * quality + 5 * (positions - 2)), 40, 130).astype(int)
+    start_probability = np.clip(0.2 + 0.5 * quality, 0.05, 0.95)
+
+    pd.DataFrame({"first_name": first_names, "second_name": second_names, "id": ids}).to_csv(
+        os.path.join(season_dir, "player_idlist.csv"), index=False)
+
+    # gameweeks
+    strength = rng.normal(0, 0.3, clubs + 1)
+    total_points = np.zeros(players, dtype=int)
+    value = prices.copy()
+    tables = []
+    for gameweek in range(1, gameweeks + 1):
+        opponents = rng.permutation(club_ids)
+        opponent = opponents[teams - 1]
+        starts = rng.random(players) < start_probability
+        subbed = ~starts & (rng.random(players) < 0.3)
+        minutes = np.where(starts, rng.choice([60, 75, 90, 90, 90], players), 0)
+        minutes = np.where(subbed, rng.integers(1, 30, players), minutes)
+        played = minutes > 0
+        attack = np.exp(strength[teams] - strength[opponent]) * quality
+        goals = rng.poisson(0.15 * attack * (positions - 1) * minutes / 90)
+        assists = rng.poisson(0.1 * attack * minutes / 90)
+        conceded = rng.poisson(np.exp(strength[opponent] - strength[teams]))
+        clean_sheets = played & (minutes >= 60) & (conceded == 0)
+        bonus = np.where(played, rng.choice([0, 0, 0, 1, 2, 3], players), 0)
+        points = (played.astype(int) + (minutes >= 60) + GOAL_POINTS[positions] * goals + 3 * assists
+                  + CLEAN_SHEET_POINTS[positions] * clean_sheets + bonus)
+        total_points += points
+        value = value + rng.choice([-1, 0, 0, 0, 1], players) * (gameweek % 4 == 0)
+
+        table = pd.DataFrame(0, index=np.arange(players), columns=GAMEWEEK_COLUMNS)
+        table["element"] = ids
+        table["id"] = ids
+        table["fixture"] = (gameweek - 1) * clubs + teams
+        table["round"] = gameweek
+        table["kickoff_time"] = f"2020-09-{gameweek % 28 + 1:02d}T15:00:00Z"
+        table["opponent_team"] = opponent
+        table["was_home"] = teams < opponent
+        table["minutes"] = minutes
+        table["goals_scored"] = goals
+        table["assists"] = assists
+        table["clean_sheets"] = clean_sheets.astype(int)
+        table["goals_conceded"] = np.where(played, conceded, 0)
+        table["bonus"] = bonus
+        table["bps"] = np.where(played, rng.integers(0, 40, players), 0) + 10 * bonus
+        table["influence"] = np.round(rng.gamma(2, 5 * quality) * played, 1)
+        table["creativity"] = np.round(rng.gamma(2, 5 * quality) * played, 1)
+        table["threat"] = np.round(rng.gamma(2, 5 * quality) * played, 1)
+        table["ict_index"] = np.round((table["influence"] + table["creativity"] + table["threat"]) / 10, 1)
+        table["saves"] = np.where(positions == 1, rng.poisson(2 * played), 0)
+        table["selected"] = rng.integers(1000, 1000000, players)
+        table["transfers_in"] = rng.integers(0, 10000, players)
+        table["transfers_out"] = rng.integers(0, 10000, players)
+        table["transfers_balance"] = table["transfers_in"] - table["transfers_out"]
+        table["total_points"] = points
+        table["value"] = value
+        table.insert(0, "name", [first + " " + second for first, second in names])
+        table.to_csv(os.path.join(season_dir, "gws", f"gw{gameweek}.csv"), index=False)
+        tables.append(table)
+
+    pd.DataFrame({"id": ids, "first_name": first_names, "second_name": second_names,
+                  "web_name": second_names, "element_type": positions, "team": teams,
+                  "now_cost": value, "total_points": total_points, "status": "a"}).to_csv(
+        os.path.join(season_dir, "players_raw.csv"), index=False)
+
+    # one gw.csv file per player
+    seasons = pd.concat(tables, ignore_index=True).drop(columns="name")
+    for (first, second), player_id, rows in zip(names, ids, np.arange(len(seasons)).reshape(gameweeks, players).T):
+        folder = os.path.join(season_dir, "players", f"{first}_{second}_{player_id}")
+        os.makedirs(folder, exist_ok=True)
+        seasons.iloc[rows].to_csv(os.path.join(folder, "gw.csv"), index=False)
+    return season_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic season")
+    parser.add_argument("root", help="data root")
+    parser.add_argument("--season", default="2020-21")
+    parser.add_argument("--clubs", type=int, default=20)
+    parser.add_argument("--players-per-club", type=int, default=30)
+    parser.add_argument("--gameweeks", type=int, default=38)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_season(args.root, args.season, args.clubs, args.players_per_club, args.gameweeks, args.seed))
@@ -0,0 +1,186 @@
+"""
+Q-learning agent playing the FPL environments of environment.py.
+Transitions are stored in a preallocated, array-backed replay buffer,
+and the Q-function is a neural network built from a list of modules,
+like the models in create_training_set.py.
+
+The discrete action space of the agent has 15 * players + 5 actions:
+    - slot * players + row: replace the player in slot by row
+    - 15 * players: do nothing
+    - 15 * players + chip: play chip 1-4 (ordered as in FPL)
+"""
+
+import copy
+import numpy as np
+import torch
+import torch.nn as nn
+from environment import NO_CHIP
+
+
+class ReplayBuffer:
+    """Ring buffer of transitions, stored in preallocated NumPy arrays.
+    When the buffer is full, the oldest transitions are overwritten.
+
+    Parameters:
+    ----------
+    capacity : int
+        maximum number of transitions
+    observation_size : int
+        length of the observation vectors
+    dtype : numpy dtype
+        storage type of the observations. float16 halves the memory
+    """
+    def __init__(self, capacity, observation_size, dtype=np.float32):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, observation_size), dtype=dtype)
+        self.next_states = np.zeros((capacity, observation_size), dtype=dtype)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """Memory used by the buffer, in bytes
+        """
+        return sum(array.nbytes for array in
+                   [self.states, self.next_states, self.actions, self.rewards, self.dones])
+
+    def add(self, states, actions, rewards, next_states, dones):
+        """Add a batch of transitions, for instance one per environment
+        of a VectorFPLEnv
+        """
+        states = np.atleast_2d(states)
+        index = (self.position + np.arange(len(states))) % self.capacity
+        self.states[index] = states
+        self.next_states[index] = np.atleast_2d(next_states)
+        self.actions[index] = actions
+        self.rewards[index] = rewards
+        self.dones[index] = dones
+        self.position = (self.position + len(states)) % self.capacity
+        self.size = min(self.size + len(states), self.capacity)
+
+    def sample(self, batch_size, rng=None):
+        """Sample a minibatch of transitions uniformly
+
+        Returns:
+        --------
+        states, actions, rewards, next_states, dones : ndarray
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        index = rng.integers(0, self.size, batch_size)
+        return (self.states[index], self.actions[index], self.rewards[index],
+                self.next_states[index], self.dones[index])
+
+
+def encode_action(transfers, chip, players):
+    """Get the action index of an environment action with at most one
+    transfer or one chip
+    """
+    if transfers:
+        (slot, row), = transfers
+        return slot * players + row
+    return 15 * players + chip
+
+
+def decode_action(index, players):
+    """Get the environment action (transfers, chip) of an action index
+    """
+    if index < 15 * players:
+        return [(int(index // players), int(index % players))], NO_CHIP
+    return [], int(index - 15 * players)
+
+
+def action_mask(transfers, chips):
+    """Get the mask over action indices from the masks returned by
+    FPL.legal_actions
+    """
+    return np.concatenate([transfers.ravel(), [True], chips])
+
+
+class QAgent:
+    """Approximate Q-learning agent with experience replay and a target
+    network.
+
+    Parameters:
+    ----------
+    players : int
+        number of players in the season
+    gamma : float
+        discount factor
+    lr : float
+        learning rate of the Adam optimizer
+    """
+    def __init__(self, players, gamma=0.99, lr=1e-3):
+        self.players = players
+        self.num_actions = 15 * players + 5
+        self.gamma = gamma
+        self.lr = lr
+
+    def set_model(self, modules):
+        """Set the Q-network. The last module has to output one value
+        per action (self.num_actions)
+        """
+        self.model = nn.Sequential(*modules)
+        self.target = copy.deepcopy(self.model)
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=self.lr)
+        return self.model
+
+    def act(self, observations, masks, epsilon=0.0, rng=None):
+        """Pick one legal action per observation, epsilon-greedily
+
+        Parameters:
+        ----------
+        observations : ndarray
+            array of shape (K, observation size)
+        masks : ndarray
+            boolean array of shape (K, num_actions), see action_mask
+
+        Returns:
+        --------
+        actions : ndarray
+            action indices of shape (K,)
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        with torch.inference_mode():
+            q = self.model(torch.as_tensor(observations, dtype=torch.float32)).numpy()
+        q[~masks] = -np.inf
+        actions = q.argmax(axis=1)
+
+        explore = rng.random(len(actions)) < epsilon
+        for i in np.flatnonzero(explore):
+            actions[i] = rng.choice(np.flatnonzero(masks[i]))
+        return actions
+
+    def learn(self, buffer, batch_size=64, rng=None):
+        """Do one gradient step on a minibatch from the replay buffer.
+        Returns the loss
+        """
+        states, actions, rewards, next_states, dones = buffer.sample(batch_size, rng)
+        states = torch.as_tensor(states, dtype=torch.float32)
+        next_states = torch.as_tensor(next_states, dtype=torch.float32)
+        actions = torch.as_tensor(actions, dtype=torch.int64)
+        rewards = torch.as_tensor(rewards)
+        dones = torch.as_tensor(dones)
+
+        with torch.no_grad():
+            next_q = self.target(next_states).max(dim=1).values
+            targets = rewards + self.gamma * next_q * ~dones
+        q = self.model(states).gather(1, actions[:, None])[:, 0]
+        loss = nn.functional.mse_loss(q, targets)
+
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+        return loss.item()
+
+    def update_target(self):
+        """Copy the weights of the Q-network to the target network
+        """
+        self.target.load_state_dict(self.model.state_dict())
@@ -0,0 +1,206 @@
+"""
+Backtesting of strategies over the historical seasons. A strategy is a
+callable deciding the lineup and chip of every gameweek,
+
+    strategy(season, gameweek, lineup, state) -> (lineup, chip)
+
+where lineup is the Lineup played the previous gameweek (None before
+gameweek 1, when the strategy picks its squad), state a GameweekState
+and chip NO_CHIP or a chip number 1-4, as in environment.py. The
+lineups are checked against the FPL rules, and the season is scored
+at once by the vectorized season simulator. Every season runs in its
+own process, so the strategy has to be picklable (for instance a
+module level function).
+
+Example:
+    python backtest.py results.csv
+"""
+
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import season_data
+from season_data import load_season
+from game_rules import FPL, SquadState
+from environment import NO_CHIP
+from simulator import simulate_season, count_transfers
+from squad_optimizer import optimize_squad, COMPOSITION
+from squad import Squad
+
+
+CHIP_NAMES = ["wildcard", "free hit", "triple captain", "bench boost"]
+
+Lineup = namedtuple("Lineup", ["squad", "bench", "captain", "vice_captain"])
+Lineup.__doc__ = """Squad played in a gameweek. squad holds the 15 player
+rows ordered keepers, defenders, midfielders, forwards, and bench,
+captain and vice_captain are positions in squad, as in simulate_season"""
+
+GameweekState = namedtuple("GameweekState", ["gameweek", "free_transfers", "chips", "bank", "root"])
+GameweekState.__doc__ = """State of the game before a gameweek. chips tells
+which chips can still be played, ordered as in FPL, bank is the budget
+minus the value of the squad at the current prices and root the data
+root to load the season from (None for season_data.stats_dir)"""
+
+
+def available_seasons(root=None):
+    """List the seasons under the data root that have gameweek files
+    """
+    if root is None:
+        root = season_data.stats_dir
+    root = os.path.expanduser(root)
+    return sorted(season for season in os.listdir(root)
+                  if os.path.isfile(os.path.join(root, season, "players_raw.csv"))
+                  and os.path.isdir(os.path.join(root, season, "gws")))
+
+
+def run_season(strategy, season, root=None, budget=1000):
+    """Play a strategy over a season.
+
+    Parameters:
+    ----------
+    strategy : callable
+        the strategy, see the module docstring
+    season : str
+        season name
+    root : str
+        data root. season_data.stats_dir by default
+    budget : int
+        maximum value of the squads
+
+    Returns:
+    --------
+    results : DataFrame
+        points, hits, team value, chip and transfers of every gameweek
+    """
+    if root is not None:
+        root = os.path.join(root, "")
+    stats, stat_index = load_season(season, root).gameweek_stats()
+    gameweeks = min(FPL.GAMEWEEKS, stats.shape[0] - 1)
+
+    squads = []
+    chips = np.zeros((gameweeks, 4), dtype=bool)
+    transfers = np.zeros(gameweeks, dtype=int)
+    available = [True] * 4
+    free_transfers = 1
+    owned = None
+    for gameweek in range(1, gameweeks + 1):
+        if gameweek == FPL.NEW_WILDCARD_GAMEWEEK:
+            available[0] = True
+        bank = budget if owned is None else budget - stats[gameweek, owned.squad, stat_index['value']].sum()
+        state = GameweekState(gameweek, free_transfers, tuple(available), float(bank), root)
+        lineup, chip = strategy(season, gameweek, owned, state)
+        lineup = Lineup(np.asarray(lineup.squad), np.asarray(lineup.bench),
+                        int(lineup.captain), int(lineup.vice_captain))
+
+        if owned is not None:
+            transfers[gameweek - 1] = count_transfers(lineup.squad[None], owned.squad[None])[0]
+
+        # the cost is only checked when players are bought, such that a
+        # squad is kept when its value rises
+        squad = SquadState(season, lineup.squad, lineup.bench, gameweek, budget, root)
+        assert len(squad.members) == 15, "Duplicate players in squad"
+        positions = squad.position_ids[lineup.squad]
+        assert tuple(np.bincount(positions, minlength=5)[1:]) == COMPOSITION, \
+            "Squad is not 2 keepers, 5 defenders, 5 midfielders and 3 forwards"
+        assert (np.diff(positions) >= 0).all(), "Squad is not ordered by position"
+        assert squad.valid_formation(), "Invalid formation"
+        assert squad.valid_clubs(), "Too many players from one club"
+        assert owned is not None and not transfers[gameweek - 1] or squad.valid_cost(), \
+            "Squad is too expensive"
+        assert lineup.captain != lineup.vice_captain, "Captain and vice captain are the same player"
+        if chip != NO_CHIP:
+            assert available[chip - 1], f"{CHIP_NAMES[chip - 1].capitalize()} is already played"
+            available[chip - 1] = False
+            chips[gameweek - 1, chip - 1] = True
+
+        # free transfers as in FPL.perform_actions and FPL.next_gameweek
+        if chip in (1, 2):
+            free_transfers = 1
+        else:
+            free_transfers = min(max(0, free_transfers - transfers[gameweek - 1]) + 1,
+                                 FPL.MAX_FREE_TRANSFERS)
+        squads.append(Squad(season, lineup.squad, lineup.bench, lineup.captain, lineup.vice_captain))
+        if chip != 2:
+            owned = lineup
+
+    result = simulate_season(season, *(array[None] for array in Squad.stack(squads)),
+                             chips[None], gameweeks, root=root)
+    return pd.DataFrame({
+        "season": season,
+        "gameweek": np.arange(1, gameweeks + 1),
+        "points": result.points[0],
+        "hits": result.hits[0],
+        "value": result.value[0],
+        "total": np.cumsum(result.points[0] - result.hits[0]),
+        "chip": [CHIP_NAMES[played.argmax()] if played.any() else "" for played in chips],
+        "transfers": transfers,
+    })
+
+
+def backtest(strategy, seasons=None, root=None, output=None, workers=None, name=None):
+    """Replay a strategy over many seasons, one process per season.
+
+    Parameters:
+    ----------
+    strategy : callable
+        the strategy, see the module docstring
+    seasons : list
+        season names. All seasons under the data root by default
+    root : str
+        data root. season_data.stats_dir by default
+    output : str
+        file to write the results to, as Parquet if it ends with
+        '.parquet' and as CSV otherwise
+    workers : int
+        number of processes. 0 or 1 runs in this process
+    name : str
+        name of the strategy in the results. The name of the callable
+        by default
+
+    Returns:
+    --------
+    results : DataFrame
+        one row per season and gameweek
+    """
+    if seasons is None:
+        seasons = available_seasons(root)
+    if name is None:
+        name = getattr(strategy, "__name__", type(strategy).__name__)
+
+    if workers is not None and workers <= 1:
+        frames = [run_season(strategy, season, root) for season in seasons]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(run_season, [strategy] * len(seasons), seasons,
+                                   [root] * len(seasons)))
+    results = pd.concat(frames, ignore_index=True)
+    results.insert(0, "strategy", name)
+    if output is not None:
+        if output.endswith(".parquet"):
+            results.to_parquet(output, index=False)
+        else:
+            results.to_csv(output, index=False)
+    return results
+
+
+def hold_expensive(season, gameweek, lineup, state):
+    """Baseline strategy: pick the most expensive squad before gameweek
+    1 and keep it for the season, without transfers or chips
+    """
+    if lineup is not None:
+        return lineup, NO_CHIP
+    data = load_season(season, state.root)
+    stats, stat_index = data.gameweek_stats()
+    prices = np.rint(stats[gameweek, :, stat_index['value']]).astype(int)
+    squad = optimize_squad(prices, prices, data.players_raw['element_type'].to_numpy(),
+                           data.players_raw['team'].to_numpy(), int(state.bank))
+    return Lineup(squad.squad, squad.bench, squad.captain, squad.vice_captain), NO_CHIP
+
+
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 else "backtest.csv"
+    results = backtest(hold_expensive, output=output)
+    print(results.groupby("season")["total"].last())
@@ -0,0 +1,136 @@
+"""
+Cross-check of the squad optimizer solvers. The dynamic program with
+branch and bound (solver='dp') and the MILP of SciPy (solver='milp')
+solve seeded random player pools, and every squad is checked against
+the rules. With SciPy, both solvers have to reach the same optimum;
+without SciPy only the DP squads are checked. The pools include cases
+where the club rule or the budget binds, which exercise the pruning of
+the DP.
+
+Example:
+    python check_squad_optimizer.py --pools 10
+"""
+
+import sys
+import argparse
+import numpy as np
+from game_rules import VALID_BENCH_COUNTS, MAX_PLAYERS_PER_CLUB
+from squad_optimizer import optimize_squad, milp, COMPOSITION
+
+
+def random_pool(rng, kind):
+    """Draw the points, prices, positions and clubs of a player pool,
+    and the budget and bench weight of the problem.
+
+    Parameters:
+    ----------
+    rng : Generator
+        random generator
+    kind : str
+        'random' for independent players, 'tight-club' for few clubs
+        holding the best players, such that the club rule binds, and
+        'tight-budget' for a budget close to the cheapest squad
+
+    Returns:
+    --------
+    problem : dict
+        keyword arguments of optimize_squad
+    """
+    players = int(rng.integers(60, 200))
+    positions = rng.choice([1, 2, 3, 4], players, p=[0.15, 0.35, 0.35, 0.15])
+    positions[:15] = np.repeat([1, 2, 3, 4], COMPOSITION)
+    quality = rng.lognormal(0, 0.5, players)
+    points = np.round(rng.gamma(2, 2 * quality), 1)
+    prices = np.clip(np.round(40 + 25 * quality + rng.normal(0, 5, players)), 40, 130).astype(int)
+    budget = 1000
+    if kind == "tight-club":
+        clubs = rng.integers(1, 7, players)
+        # the best players come from two clubs
+        best = np.argsort(-points)[:players // 4]
+        clubs[best] = rng.integers(1, 3, len(best))
+    else:
+        clubs = rng.integers(1, 21, players)
+    if kind == "tight-budget":
+        cheapest = sum(np.sort(prices[positions == position])[:count].sum()
+                       for position, count in zip([1, 2, 3, 4], COMPOSITION))
+        budget = int(cheapest + rng.integers(0, 40))
+    bench_weight = float(rng.choice([0.0, 0.1, 0.3]))
+    return dict(points=points, prices=prices, positions=positions, clubs=clubs, budget=budget,
+                bench_weight=bench_weight)
+
+
+def check_squad(result, points, prices, positions, clubs, budget, bench_weight):
+    """List the rules broken by a solution of optimize_squad
+    """
+    errors = []
+    squad = result.squad
+    if len(set(squad.tolist())) != 15:
+        errors.append("duplicate players")
+    if tuple(np.bincount(positions[squad], minlength=5)[1:]) != COMPOSITION:
+        errors.append("wrong composition")
+    if (np.diff(positions[squad]) < 0).any():
+        errors.append("squad not ordered by position")
+    if prices[squad].sum() > budget or (prices[squad] <= 0).any():
+        errors.append("too expensive")
+    if np.unique(clubs[squad], return_counts=True)[1].max() > MAX_PLAYERS_PER_CLUB:
+        errors.append("too many players from one club")
+    if tuple(np.bincount(positions[squad[result.bench]], minlength=5)) not in VALID_BENCH_COUNTS:
+        errors.append("invalid formation")
+    if result.captain in result.bench or result.vice_captain in result.bench \
+            or result.captain == result.vice_captain:
+        errors.append("invalid captaincy")
+    starting = np.ones(15, dtype=bool)
+    starting[result.bench] = False
+    total = (points[squad[starting]].sum() + points[squad[result.captain]]
+             + bench_weight * points[squad[~starting]].sum())
+    if not np.isclose(total, result.points):
+        errors.append(f"reported {result.points} points, squad has {total}")
+    return errors
+
+
+def check_solvers(pools=10, seed=0):
+    """Solve seeded random pools with both solvers and compare them.
+
+    Parameters:
+    ----------
+    pools : int
+        number of pools of each kind
+    seed : int
+        seed of the pools
+
+    Returns:
+    --------
+    failures : list
+        (kind, pool, message) of every failed check
+    """
+    rng = np.random.default_rng(seed)
+    failures = []
+    for kind in ("random", "tight-club", "tight-budget"):
+        for pool in range(pools):
+            problem = random_pool(rng, kind)
+            dp = optimize_squad(**problem, solver="dp")
+            for error in check_squad(dp, **problem):
+                failures.append((kind, pool, f"dp: {error}"))
+            if milp is None:
+                continue
+            exact = optimize_squad(**problem, solver="milp")
+            for error in check_squad(exact, **problem):
+                failures.append((kind, pool, f"milp: {error}"))
+            if not np.isclose(dp.points, exact.points):
+                failures.append((kind, pool, f"dp found {dp.points} points, milp {exact.points}"))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-check the squad optimizer solvers")
+    parser.add_argument("--pools", type=int, default=10, help="number of pools of each kind")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if milp is None:
+        print("SciPy is not installed, only the DP squads are checked")
+    failures = check_solvers(args.pools, args.seed)
+    for kind, pool, message in failures:
+        print(f"{kind} pool {pool}: {message}")
+    print(f"{3 * args.pools} pools checked, {len(failures)} failures")
+    sys.exit(1 if failures else 0)
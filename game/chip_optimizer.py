@@ -0,0 +1,226 @@
+"""
+Chip timing. Given the squads played over a season and the (expected)
+points of every player, finds the gameweeks to play the two wildcards,
+the free hit, the triple captain and the bench boost. Every single chip
+placement is scored in one batch by the vectorized season simulator,
+and a dynamic program over the gameweeks picks the best combination
+with at most one chip per gameweek.
+"""
+
+from collections import namedtuple
+import numpy as np
+from season_data import load_season
+from game_rules import FPL
+from simulator import simulate_season, per_gameweek
+from squad_optimizer import optimize_squad
+from squad import Squad
+
+
+# the chips that can be scheduled, with their index in the chips array
+# of simulate_season. The first wildcard is played before
+# FPL.NEW_WILDCARD_GAMEWEEK, the second from then on
+CHIPS = ["wildcard 1", "wildcard 2", "free hit", "triple captain", "bench boost"]
+CHIP_COLUMNS = [0, 0, 1, 2, 3]
+
+ChipSchedule = namedtuple("ChipSchedule", ["gameweeks", "total", "baseline", "gains", "placements"])
+ChipSchedule.__doc__ = """Result of optimize_chips. gameweeks maps each chip
+name to the gameweek it is played in (None if it is not worth playing),
+total is the season total with the chips and baseline the total without
+chips. gains maps each played chip to the points lost if it is not
+played, and placements is an array of shape (chips, gameweeks) with the
+points gained by playing each chip alone in each gameweek (NaN when it
+cannot be played)"""
+
+
+def chip_window(chip, gameweeks):
+    """Gameweeks (1, 2, ...) a chip can be played in
+    """
+    if chip == "wildcard 1":
+        return range(1, min(FPL.NEW_WILDCARD_GAMEWEEK, gameweeks + 1))
+    if chip == "wildcard 2":
+        return range(FPL.NEW_WILDCARD_GAMEWEEK, gameweeks + 1)
+    return range(1, gameweeks + 1)
+
+
+def free_hit_squads(season, points, budget=1000):
+    """Find the best squad of every gameweek, to be played with the free
+    hit chip, using the player prices of the gameweek.
+
+    Parameters:
+    ----------
+    season : str
+        season name
+    points : ndarray
+        points of every player row in each gameweek, of shape
+        (gameweeks, players)
+    budget : int
+        maximum cost of the squads
+
+    Returns:
+    --------
+    squads, bench, captain, vice_captain : ndarray
+        arrays of shapes (gameweeks, 15), (gameweeks, 4), (gameweeks,)
+        and (gameweeks,), as taken by simulate_season
+    """
+    data = load_season(season)
+    stats, stat_index = data.gameweek_stats()
+    positions = data.players_raw['element_type'].to_numpy()
+    clubs = data.players_raw['team'].to_numpy()
+    squads = []
+    for gameweek, gameweek_points in enumerate(points, start=1):
+        prices = np.rint(stats[gameweek, :, stat_index['value']]).astype(int)
+        result = optimize_squad(gameweek_points, prices, positions, clubs, budget)
+        squads.append(Squad(season, result.squad, result.bench, result.captain, result.vice_captain))
+    return Squad.stack(squads)
+
+
+def best_combination(placements):
+    """Pick at most one gameweek per chip and at most one chip per
+    gameweek, such that the sum of the gains is maximal
+
+    Parameters:
+    ----------
+    placements : ndarray
+        gains of shape (chips, gameweeks), NaN where a chip cannot be
+        played
+
+    Returns:
+    --------
+    weeks : list
+        index of the gameweek of every chip, or None
+    """
+    num_chips, num_gameweeks = placements.shape
+    value = np.full(2 ** num_chips, -np.inf)
+    value[0] = 0
+    choices = []
+    for week in range(num_gameweeks):
+        new_value = value.copy()
+        choice = np.full(2 ** num_chips, -1)
+        for mask in np.flatnonzero(np.isfinite(value)):
+            for chip in range(num_chips):
+                gain = placements[chip, week]
+                if mask >> chip & 1 or not np.isfinite(gain):
+                    continue
+                if value[mask] + gain > new_value[mask | 1 << chip]:
+                    new_value[mask | 1 << chip] = value[mask] + gain
+                    choice[mask | 1 << chip] = chip
+        choices.append(choice)
+        value = new_value
+
+    weeks = [None] * num_chips
+    mask = int(np.argmax(value))
+    for week in reversed(range(num_gameweeks)):
+        chip = choices[week][mask]
+        if chip >= 0:
+            weeks[chip] = week
+            mask ^= 1 << chip
+    return weeks
+
+
+def optimize_chips(season, squads, bench, captain, vice_captain, points=None, minutes=None,
+                   free_hit=None, chips=CHIPS, budget=1000):
+    """Find the best gameweeks to play the chips for a squad trajectory.
+
+    The gain of every chip in every gameweek is simulated with the other
+    chips unused. The combination with the largest sum of gains is then
+    simulated exactly, since a wildcard or free hit also changes the
+    free transfers of the following gameweeks.
+
+    Parameters:
+    ----------
+    season : str
+        season name
+    squads : ndarray
+        player rows of the squad of every gameweek, of shape
+        (gameweeks, 15), see simulate_season
+    bench : ndarray
+        bench positions, of shape (4,) or (gameweeks, 4)
+    captain : ndarray
+        captain position, int or of shape (gameweeks,)
+    vice_captain : ndarray
+        vice captain position, shaped as captain
+    points : ndarray
+        projected points of every player row, of shape (gameweeks,
+        players). The points of the season by default
+    minutes : ndarray
+        projected minutes, shaped as points. When points are given
+        without minutes, every player is assumed to play
+    free_hit : tuple
+        (squads, bench, captain, vice_captain) played in each gameweek
+        with the free hit, see free_hit_squads. By default the best
+        squads for points are found
+    chips : list
+        names of the chips still available, see CHIPS
+    budget : int
+        budget of the free hit squads
+
+    Returns:
+    --------
+    schedule : ChipSchedule
+    """
+    squads = np.asarray(squads)
+    gameweeks = len(squads)
+    bench = per_gameweek(np.asarray(bench)[None], 1, gameweeks, 4)[0]
+    captain = per_gameweek(np.atleast_1d(captain)[None], 1, gameweeks)[0]
+    vice_captain = per_gameweek(np.atleast_1d(vice_captain)[None], 1, gameweeks)[0]
+    if points is None:
+        stats, stat_index = load_season(season).gameweek_stats()
+        points = stats[1:gameweeks + 1, :, stat_index['total_points']]
+    elif minutes is None:
+        minutes = np.full(np.shape(points), 90)
+    if "free hit" in chips and free_hit is None:
+        free_hit = free_hit_squads(season, points[:gameweeks], budget)
+
+    # schedule 0 plays no chips, the others one chip in one gameweek
+    placements = [(None, None)]
+    for chip in chips:
+        placements += [(chip, week) for week in chip_window(chip, gameweeks)]
+    lineups = [np.repeat(array[None], len(placements), axis=0)
+               for array in (squads, bench, captain, vice_captain)]
+    played = np.zeros((len(placements), gameweeks, 4), dtype=bool)
+    for i, (chip, week) in enumerate(placements[1:], start=1):
+        played[i, week - 1, CHIP_COLUMNS[CHIPS.index(chip)]] = True
+        if chip == "free hit":
+            for lineup, array in zip(lineups, free_hit):
+                lineup[i, week - 1] = array[week - 1]
+    result = simulate_season(season, *lineups, played, gameweeks, points, minutes)
+    baseline = result.total[0]
+
+    gains = np.full((len(CHIPS), gameweeks), np.nan)
+    for (chip, week), total in zip(placements[1:], result.total[1:]):
+        gains[CHIPS.index(chip), week - 1] = total - baseline
+    weeks = best_combination(gains)
+
+    # simulate the schedule, and the schedule without each of its chips
+    scheduled = [chip for chip, week in zip(CHIPS, weeks) if week is not None]
+    lineups = [np.repeat(array[None], len(scheduled) + 1, axis=0)
+               for array in (squads, bench, captain, vice_captain)]
+    played = np.zeros((len(scheduled) + 1, gameweeks, 4), dtype=bool)
+    for chip in scheduled:
+        week = weeks[CHIPS.index(chip)]
+        for i in range(len(scheduled) + 1):
+            if i > 0 and scheduled[i - 1] == chip:
+                continue
+            played[i, week, CHIP_COLUMNS[CHIPS.index(chip)]] = True
+            if chip == "free hit":
+                for lineup, array in zip(lineups, free_hit):
+                    lineup[i, week] = array[week]
+    result = simulate_season(season, *lineups, played, gameweeks, points, minutes)
+
+    total = result.total[0]
+    return ChipSchedule({chip: None if week is None else week + 1 for chip, week in zip(CHIPS, weeks)},
+                        total, baseline,
+                        {chip: total - other for chip, other in zip(scheduled, result.total[1:])},
+                        gains)
+
+
+def print_schedule(schedule):
+    """Print the chip gameweeks and gains of a ChipSchedule
+    """
+    print(f"Points without chips: {schedule.baseline:.1f}")
+    for chip, gameweek in schedule.gameweeks.items():
+        if gameweek is None:
+            print(f"{chip:15s} not played")
+        else:
+            print(f"{chip:15s} gameweek {gameweek:2d}, gain {schedule.gains[chip]:.1f}")
+    print(f"Points with chips: {schedule.total:.1f}")
@@ -1,9 +1,20 @@
-import os
+import logging
 import torch
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 from tqdm import tqdm
 import torch.nn as nn
+from training import train_model
+from torch.utils.data import IterableDataset, get_worker_info
+from csv_loader import iter_csvs, player_folders
+import season_data
+from logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+player_properties = ["assists", "attempted_passes", "big_chances_created", "big_chances_missed", "bonus", "bps", "clean_sheets", "clearances_blocks_interceptions", "completed_passes", "creativity", "dribbles", "ea_index", "element", "errors_leading_to_goal", "errors_leading_to_goal_attempt", "fixture", "fouls", "goals_conceded", "goals_scored", "ict_index", "id", "influence", "key_passes", "loaned_in", "loaned_out", "minutes", "offside", "open_play_crosses", "opponent_team", "own_goals", "penalties_conceded", "penalties_missed", "penalties_saved", "recoveries", "red_cards", "round", "saves", "selected", "tackled", "tackles", "target_missed", "team_a_score", "team_h_score", "threat", "total_points", "transfers_balance", "transfers_in", "transfers_out", "value", "was_home", "winning_goals", "yellow_cards"]
 
 
 class TrainingSet:
@@ -12,11 +23,11 @@ class TrainingSet:
         # self.collect_fixtures_data(season)
 
     def collect_fixtures_data(self, season):
-        path = f"/home/evenmn/Fantasy-Premier-League/data/{season}/fixtures.csv"
+        path = f"{season_data.data_dir()}{season}/fixtures.csv"
         self.fixtures = pd.read_csv(path)
 
     def collect_player_ids(self, season):
-        path = f"/home/evenmn/Fantasy-Premier-League/data/{season}/player_idlist.csv"
+        path = f"{season_data.data_dir()}{season}/player_idlist.csv"
         self.player_ids = pd.read_csv(path)
         return self.player_ids
 
@@ -26,7 +37,7 @@ class TrainingSet:
         player_name = player_ids["first_name"][index] + " " + \
                       player_ids["second_name"][index]
         player_name = player_name.replace(" ", "_")
-        path = f"/home/evenmn/Fantasy-Premier-League/data/{season}/players/{player_name}_{id}/gw.csv"
+        path = f"{season_data.data_dir()}{season}/players/{player_name}_{id}/gw.csv"
         return pd.read_csv(path)
 
     def expected_points(self):
@@ -36,48 +47,56 @@ class TrainingSet:
         player_properties = ["bps", "creativity", "ict_index", "influence", "minutes", "opponent_team", "team_a_score", "team_h_score", "threat", "total_points", "was_home"]
         print(data[player_properties])
 
-    def collect_player_datas(self):
-        print("Collecting player data...")
-        season = self.season
-        path = f"/home/evenmn/Fantasy-Premier-League/data/{season}/players/"
+    def collect_player_datas(self, workers=None):
+        logger.info("Collecting player data...")
+        return list(self.iter_player_datas(workers=workers))
+
+    def iter_player_datas(self, players=None, workers=None):
+        """Read the gw.csv files of the season in parallel, and yield
+        them one player at a time in the order of players
+
+        Parameters:
+        ----------
+        players : list
+            player folders to read. All players by default
+        workers : int
+            number of reading threads, see csv_loader.iter_csvs
+        """
+        path = f"{season_data.data_dir()}{self.season}/players/"
         # player_properties = ["bps", "creativity", "ict_index", "influence", "minutes", "opponent_team", "team_a_score", "team_h_score", "threat", "total_points", "was_home"]
-        players = next(os.walk(path))[1]
-        all_data = []
-        for player in tqdm(players):
-            full_path = path + player + "/gw.csv"
-            data = pd.read_csv(full_path)
-            all_data.append(data)  # [player_properties])
-        return all_data
+        if players is None:
+            players = self.player_folders()
+        paths = [path + player + "/gw.csv" for player in players]
+        for data in tqdm(iter_csvs(paths, workers), total=len(paths),
+                         disable=not logger.isEnabledFor(logging.INFO)):
+            yield data  # [player_properties])
+
+    def player_folders(self):
+        """List the player folders of the season, sorted
+        """
+        path = f"{season_data.data_dir()}{self.season}/players/"
+        return player_folders(path)
 
     def prepare_data_sets(self, dept=5, test=0.2):
         """Preparing training set, test set and targets
         """
-        # player_properties = ["bps", "creativity", "ict_index", "influence", "minutes", "opponent_team", "team_a_score", "team_h_score", "threat", "total_points", "was_home"]
-        player_properties = ["assists", "attempted_passes", "big_chances_created", "big_chances_missed", "bonus", "bps", "clean_sheets", "clearances_blocks_interceptions", "completed_passes", "creativity", "dribbles", "ea_index", "element", "errors_leading_to_goal", "errors_leading_to_goal_attempt", "fixture", "fouls", "goals_conceded", "goals_scored", "ict_index", "id", "influence", "key_passes", "loaned_in", "loaned_out", "minutes", "offside", "open_play_crosses", "opponent_team", "own_goals", "penalties_conceded", "penalties_missed", "penalties_saved", "recoveries", "red_cards", "round", "saves", "selected", "tackled", "tackles", "target_missed", "team_a_score", "team_h_score", "threat", "total_points", "transfers_balance", "transfers_in", "transfers_out", "value", "was_home", "winning_goals", "yellow_cards"]
         number_of_features = dept * len(player_properties)
         datas = self.collect_player_datas()
-        print("\nPreparing training set...")
-        print(f"Number of features: {number_of_features}")
+        logger.info("Preparing training set...")
+        logger.info("Number of features: %d", number_of_features)
         inputs = []
         targets = []
-        j = 0
-        for data in tqdm(datas):
-            end = False
-            i = 0
-            while not end:
-                try:
-                    inp = np.asarray(data[player_properties][i:i+dept], dtype=float).flatten()
-                    if len(inp) == number_of_features:
-                        targets.append(data["total_points"][i+dept+1])
-                        inputs.append(inp)
-                        j += 1
-                    else:
-                        end = True
-                except KeyError:
-                    end = True
-                i += 1
-        inputs = np.asarray(inputs, dtype=float)
-        targets = np.asarray(targets, dtype=int)
+        for data in tqdm(datas, disable=not logger.isEnabledFor(logging.INFO)):
+            windows = player_windows(data, dept)
+            if windows is not None:
+                inputs.append(windows[0])
+                targets.append(windows[1])
+        if inputs:
+            inputs = np.concatenate(inputs)
+            targets = np.concatenate(targets).astype(int)
+        else:
+            inputs = np.asarray(inputs, dtype=float)
+            targets = np.asarray(targets, dtype=int)
 
         assert len(inputs) == len(targets)
 
@@ -92,38 +111,75 @@ class TrainingSet:
 
         return train_x, train_t, test_x, test_t
 
-    def set_model(self, modules):
-        self.model = nn.Sequential(*modules)
-        return self.model
+    def stream_data_sets(self, dept=5, chunk_size=4096, players=None):
+        """Stream the windows of prepare_data_sets in float32 chunks,
+        without reading all players first. Only one chunk and one
+        player are held in memory at a time
 
-    def train_torch(self, x, t, lr, max_iter):
-        """Train the neural network model.
+        Parameters:
+        ----------
+        dept : int
+            number of gameweeks in a window
+        chunk_size : int
+            number of windows per chunk. The last chunk may be smaller
+        players : list
+            player folders to stream. All players by default
+
+        Returns:
+        --------
+        generator of (x, t), with x of shape (chunk_size, dept * features)
+        and t of shape (chunk_size, 1)
         """
-        print("\nTraining...")
-        # Get data
-        x = torch.tensor(x)
-        t = torch.tensor(t)
+        number_of_features = dept * len(player_properties)
+        x = np.empty((chunk_size, number_of_features), dtype=np.float32)
+        t = np.empty((chunk_size, 1), dtype=np.float32)
+        filled = 0
+        for data in self.iter_player_datas(players):
+            windows = player_windows(data, dept)
+            if windows is None:
+                continue
+            inputs, targets = windows
+            start = 0
+            while start < len(inputs):
+                size = min(chunk_size - filled, len(inputs) - start)
+                x[filled:filled+size] = inputs[start:start+size]
+                t[filled:filled+size, 0] = targets[start:start+size]
+                filled += size
+                start += size
+                if filled == chunk_size:
+                    yield x, t
+                    x = np.empty_like(x)
+                    t = np.empty_like(t)
+                    filled = 0
+        if filled:
+            yield x[:filled], t[:filled]
 
-        # Define loss and optimizer
-        loss_func = nn.MSELoss()
-        optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
+    def write_shard(self, path, dept=5, chunk_size=4096):
+        """Write all windows of the season to a binary shard, see
+        read_shard. Returns the number of windows written
+        """
+        count = 0
+        with open(path, "wb") as f:
+            for x, t in self.stream_data_sets(dept, chunk_size):
+                np.hstack([x, t]).tofile(f)
+                count += len(x)
+        return count
 
-        # Train network
-        for epoch in range(max_iter):
-            # Forward propagation
-            y = self.model(x.float())
-            loss = loss_func(y, t.float())
-            print("epoch: ", epoch, " loss: ", loss.item())  # Zero the gradients
-            optimizer.zero_grad()
+    def set_model(self, modules):
+        self.model = nn.Sequential(*modules)
+        return self.model
 
-            # Backward propagation
-            loss.backward()   # perform a backward pass (backpropagation)
-            optimizer.step()  # update parameters
+    def train_torch(self, x, t, lr, max_iter, batch_size=256, **kwargs):
+        """Train the neural network model on mini-batches for at most
+        max_iter epochs. See training.train_model for the options
+        """
+        logger.info("Training...")
+        return train_model(self.model, x, t, lr, max_iter, batch_size, **kwargs)
 
     def test(self, x, t):
         """
         """
-        print("\nTesting...")
+        logger.info("Testing...")
         # Get data
         x = torch.tensor(x)
         t = torch.tensor(t)
@@ -132,10 +188,76 @@ class TrainingSet:
         y = self.model(x.float())
         loss_func = nn.MSELoss()
         loss = loss_func(y, t.float())
-        print(loss)
+        logger.info("Test loss: %.4f", float(loss))
+
+
+def player_windows(data, dept):
+    """Get the windows of dept gameweeks of one player, flattened as in
+    prepare_data_sets, together with the total points dept+1 gameweeks
+    after the start of each window. None is returned if the player has
+    missing properties or too few gameweeks
+    """
+    try:
+        values = data[player_properties].to_numpy(dtype=float)
+    except KeyError:
+        return None
+    # the target of the window starting at row i is row i+dept+1
+    count = len(values) - dept - 1
+    if count <= 0:
+        return None
+    windows = sliding_window_view(values, dept, axis=0)[:count]
+    inputs = windows.transpose(0, 2, 1).reshape(count, dept * len(player_properties))
+    return inputs, data["total_points"].to_numpy()[dept+1:]
+
+
+def read_shard(path, dept=5):
+    """Memory-map a shard written by TrainingSet.write_shard
+
+    Returns:
+    --------
+    x : ndarray
+        float32 windows of shape (windows, dept * features)
+    t : ndarray
+        float32 targets of shape (windows, 1)
+    """
+    shard = np.memmap(path, dtype=np.float32, mode="r")
+    shard = shard.reshape(-1, dept * len(player_properties) + 1)
+    return shard[:, :-1], shard[:, -1:]
+
+
+class StreamingTrainingSet(IterableDataset):
+    """The windows of several seasons as a torch IterableDataset of
+    float32 chunks, for training on many seasons with bounded memory.
+    Use it with DataLoader(dataset, batch_size=None). With several
+    DataLoader workers, the players are split between the workers
+
+    Parameters:
+    ----------
+    seasons : list
+        season names ('2019-20' and so on)
+    dept : int
+        number of gameweeks in a window
+    chunk_size : int
+        number of windows per chunk
+    """
+    def __init__(self, seasons, dept=5, chunk_size=4096):
+        self.seasons = seasons
+        self.dept = dept
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        worker = get_worker_info()
+        for season in self.seasons:
+            train = TrainingSet(season=season)
+            players = train.player_folders()
+            if worker is not None:
+                players = players[worker.id::worker.num_workers]
+            for x, t in train.stream_data_sets(self.dept, self.chunk_size, players):
+                yield torch.from_numpy(x), torch.from_numpy(t)
 
 
 if __name__ == "__main__":
+    setup_logging()
     seasons = ["2016-17", "2017-18", "2018-19", "2019-20"]
     train_x, train_t, test_x, test_t = [], [], [], []
     for season in seasons:
@@ -0,0 +1,101 @@
+"""
+Parallel reading of the many small CSV files of the scraper, such as
+'season/players/<player>/gw.csv'. The files are read on a thread
+(or process) pool and returned in the order they were requested.
+"""
+
+import os
+import bisect
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+from profiling import section
+
+
+def default_workers():
+    """Number of workers used when none is given
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def read_csv(path):
+    """Read a CSV file, recorded per file when profiling (see
+    profiling.py)
+    """
+    with section("read " + str(path)):
+        return pd.read_csv(path)
+
+
+def iter_csvs(paths, workers=None, processes=False):
+    """Read CSV files in parallel and yield the frames in the order of
+    paths. At most a few files per worker are read ahead, such that
+    the frames do not pile up in memory when they are consumed slowly.
+
+    Parameters:
+    ----------
+    paths : list
+        paths of the CSV files
+    workers : int
+        number of workers. All cores are used by default, and with 0
+        or 1 the files are read in this thread
+    processes : bool
+        use a process pool instead of a thread pool
+    """
+    if workers is None:
+        workers = default_workers()
+    if workers <= 1:
+        for path in paths:
+            yield read_csv(path)
+        return
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(read_csv, path))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_csvs(paths, workers=None, processes=False):
+    """Read CSV files in parallel, see iter_csvs
+
+    Returns:
+    --------
+    frames : list
+        one DataFrame per path, in the order of paths
+    """
+    return list(iter_csvs(paths, workers, processes))
+
+
+def player_folders(players_dir, file=None):
+    """List the player folders of a 'season/players' directory in sorted
+    order, with a single directory listing
+
+    Parameters:
+    ----------
+    players_dir : str
+        the 'season/players' directory
+    file : str
+        only keep folders containing this file, e.g. 'gw.csv'
+    """
+    players_dir = os.path.expanduser(players_dir)
+    folders = []
+    with os.scandir(players_dir) as entries:
+        for entry in entries:
+            if entry.is_dir() and (file is None or os.path.isfile(os.path.join(entry.path, file))):
+                folders.append(entry.name)
+    return sorted(folders)
+
+
+def find_folder(folders, prefix):
+    """Find the last folder starting with prefix in a sorted list of
+    folders, like the last match of glob(prefix + '*'). None is
+    returned if no folder matches
+    """
+    end = bisect.bisect_left(folders, prefix + "\U0010ffff")
+    if end > 0 and folders[end - 1].startswith(prefix):
+        return folders[end - 1]
+    return None
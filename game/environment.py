@@ -0,0 +1,313 @@
+"""
+Gym-style environments for training agents on the FPL game. FPLEnv
+plays one season with reset/step, and VectorFPLEnv steps many
+environments in lock-step, either in-process or spread over worker
+processes that write their observations to shared memory.
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from players import Player
+from team import Team
+from game_rules import FPL, SquadState
+from season_data import load_season
+
+
+# features per squad slot and global features of an observation
+SLOT_FEATURES = 7
+GLOBAL_FEATURES = 7
+OBSERVATION_SIZE = 15 * SLOT_FEATURES + GLOBAL_FEATURES
+
+NO_CHIP = 0
+
+
+def make_team(season, rows, bench, captain, vice_captain):
+    """Create a Team from player rows.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    rows : list
+        rows of the 15 players, ordered keepers, defenders,
+        midfielders, forwards
+    bench : list
+        positions of the 4 bench players in rows
+    captain : int
+        position of the captain in rows
+    vice_captain : int
+        position of the vice captain in rows
+    """
+    players = [Player.from_row(season, row) for row in rows]
+    return Team(season, players[:2], players[2:7], players[7:12], players[12:],
+                [players[slot] for slot in bench], players[captain], players[vice_captain])
+
+
+class FPLEnv:
+    """A season of FPL as a reinforcement learning environment.
+
+    An action is a tuple (transfers, chip), where transfers is a list
+    of (slot, row) pairs replacing the player in a squad slot by the
+    player of a row (see FPL.legal_actions), and chip is 0 for no chip
+    or 1-4 for the chips ordered as in FPL. The action is applied
+    before the current gameweek is played, and the reward is the
+    gameweek points minus the transfer hits. Illegal actions are
+    ignored and give the reward illegal_penalty instead.
+
+    The observation is a float32 vector of length OBSERVATION_SIZE with
+    the position, price, last gameweek points, last gameweek minutes,
+    season points, bench flag and captain flag of every squad slot,
+    followed by the gameweek, free transfers, money in the bank and
+    the availability of the four chips.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    rows : list
+        rows of the initial 15 players, see make_team
+    bench : list
+        positions of the bench players in rows
+    captain : int
+        position of the captain in rows
+    vice_captain : int
+        position of the vice captain in rows
+    illegal_penalty : float
+        reward given for an illegal action
+    """
+    def __init__(self, season, rows, bench, captain, vice_captain, illegal_penalty=-10):
+        self.season = season
+        # teams are not changed in place, so the checked initial team is
+        # shared by all seasons played
+        self.initial_team = make_team(season, rows, bench, captain, vice_captain)
+        self.illegal_penalty = illegal_penalty
+        stats, stat_index = load_season(season).gameweek_stats()
+        self.gameweeks = min(FPL.GAMEWEEKS, stats.shape[0] - 1)
+        self.game = None
+
+    def reset(self):
+        """Start a new season with the initial squad
+
+        Returns:
+        --------
+        observation : ndarray
+        info : dict
+        """
+        self.game = FPL(self.initial_team, [False, False, False, False])
+        return self.observation(), {}
+
+    def step(self, action):
+        """Apply an action and play the current gameweek
+
+        Returns:
+        --------
+        observation : ndarray
+        reward : float
+        terminated : bool
+            True when the season is over
+        truncated : bool
+            always False
+        info : dict
+            points, hit and whether the action was illegal
+        """
+        transfers, chip = action
+        hit = 0
+        illegal = not self.legal(transfers, chip)
+        if not illegal and (transfers or chip != NO_CHIP):
+            chips = [i == chip for i in range(1, 5)]
+            team = self.game.team
+            if transfers:
+                squad = team.squad
+                for slot, row in transfers:
+                    squad = squad.transfer(slot, row)
+                team = team.with_squad(squad)
+            # the action is checked by legal, so the team is not validated
+            # again. A free hit squad is reverted by FPL after the gameweek
+            hit = self.game.perform_actions(team, chips, checked=True)
+
+        total_before = self.game.total_points
+        self.game.next_gameweek()
+        points = self.game.total_points - total_before
+        reward = self.illegal_penalty if illegal else points - hit
+        terminated = self.game.gameweek > self.gameweeks
+        info = {"points": points, "hit": hit, "illegal": illegal}
+        return self.observation(), reward, terminated, False, info
+
+    def legal(self, transfers, chip):
+        """Check if an action is legal in the current state
+        """
+        chips = self.game.available_chips()
+        if chip != NO_CHIP and not chips[chip - 1]:
+            return False
+        state = SquadState.from_team(self.game.team, self.game.gameweek, self.game.money_bank)
+        for slot, row in transfers:
+            if not state.check_transfer(slot, row):
+                return False
+            state.transfer(slot, row)
+        return True
+
+    def observation(self):
+        """Build the observation vector of the current state
+        """
+        data = load_season(self.season)
+        stats, stat_index = data.gameweek_stats()
+        gameweek = min(self.game.gameweek, self.gameweeks)
+        squad = self.game.team.squad
+        rows = squad.rows
+
+        slots = np.zeros((15, SLOT_FEATURES), dtype=np.float32)
+        slots[:, 0] = data.position_ids[rows]
+        slots[:, 1] = stats[gameweek, rows, stat_index['value']]
+        slots[:, 2] = stats[gameweek - 1, rows, stat_index['total_points']]
+        slots[:, 3] = stats[gameweek - 1, rows, stat_index['minutes']]
+        slots[:, 4] = stats[:gameweek, rows, stat_index['total_points']].sum(axis=0)
+        slots[squad.bench, 5] = 1
+        slots[squad.captain, 6] = 1
+
+        played = [self.game.wildcard_played, self.game.free_hit_played,
+                  self.game.triple_cap_played, self.game.bench_boost_played]
+        bank = self.game.money_bank - slots[:, 1].sum()
+        free_transfers = min(self.game.free_transfers, FPL.MAX_FREE_TRANSFERS)
+        globals_ = [self.game.gameweek, free_transfers, bank] + [not chip for chip in played]
+        return np.concatenate([slots.ravel(), np.array(globals_, dtype=np.float32)])
+
+
+class VectorFPLEnv:
+    """Step K environments in lock-step. Environments that finish their
+    season are reset automatically, and the returned observation is
+    the first observation of the new season.
+
+    Parameters:
+    ----------
+    env_fns : list
+        functions creating the FPLEnv objects
+    workers : int
+        number of worker processes. With 0, all environments are
+        stepped in this process. Otherwise the environments are split
+        between the workers, which write their observations directly
+        to a shared memory buffer
+    """
+    def __init__(self, env_fns, workers=0):
+        self.num_envs = len(env_fns)
+        self.workers = workers
+        if workers:
+            self.shared = shared_memory.SharedMemory(create=True, size=self.num_envs * OBSERVATION_SIZE * 4)
+            self.observations = np.ndarray((self.num_envs, OBSERVATION_SIZE), dtype=np.float32,
+                                           buffer=self.shared.buf)
+            self.remotes = []
+            self.processes = []
+            for indices in np.array_split(np.arange(self.num_envs), workers):
+                remote, child = mp.Pipe()
+                process = mp.Process(target=worker, daemon=True,
+                                     args=(child, [env_fns[i] for i in indices], indices,
+                                           self.shared.name, self.num_envs))
+                process.start()
+                child.close()
+                self.remotes.append(remote)
+                self.processes.append(process)
+        else:
+            self.envs = [env_fn() for env_fn in env_fns]
+            self.observations = np.zeros((self.num_envs, OBSERVATION_SIZE), dtype=np.float32)
+
+    def reset(self):
+        """Reset all environments
+
+        Returns:
+        --------
+        observations : ndarray
+            array of shape (K, OBSERVATION_SIZE)
+        infos : list
+        """
+        if self.workers:
+            for remote in self.remotes:
+                remote.send(("reset", None))
+            infos = sum((remote.recv() for remote in self.remotes), [])
+        else:
+            infos = []
+            for i, env in enumerate(self.envs):
+                self.observations[i], info = env.reset()
+                infos.append(info)
+        return self.observations.copy(), infos
+
+    def step(self, actions):
+        """Step all environments with one action each
+
+        Returns:
+        --------
+        observations : ndarray
+            array of shape (K, OBSERVATION_SIZE)
+        rewards : ndarray
+        terminated : ndarray
+        truncated : ndarray
+        infos : list
+        """
+        if self.workers:
+            for remote, process_actions in zip(self.remotes, self.split(actions)):
+                remote.send(("step", process_actions))
+            results = sum((remote.recv() for remote in self.remotes), [])
+        else:
+            results = step_envs(self.envs, actions, self.observations, np.arange(self.num_envs))
+        rewards, terminated, truncated, infos = zip(*results)
+        return (self.observations.copy(), np.array(rewards, dtype=np.float32),
+                np.array(terminated), np.array(truncated), list(infos))
+
+    def split(self, actions):
+        """Split the actions between the workers
+        """
+        sizes = [len(indices) for indices in np.array_split(np.arange(self.num_envs), self.workers)]
+        offsets = np.cumsum([0] + sizes)
+        return [actions[offsets[i]:offsets[i+1]] for i in range(self.workers)]
+
+    def close(self):
+        """Stop the workers and free the shared memory
+        """
+        if self.workers:
+            for remote in self.remotes:
+                remote.send(("close", None))
+            for process in self.processes:
+                process.join()
+            del self.observations
+            self.shared.close()
+            self.shared.unlink()
+            self.workers = 0
+
+
+def step_envs(envs, actions, observations, indices):
+    """Step environments and write their observations to the given
+    rows of observations. Finished environments are reset
+    """
+    results = []
+    for env, action, i in zip(envs, actions, indices):
+        observation, reward, terminated, truncated, info = env.step(action)
+        if terminated or truncated:
+            info["final_observation"] = observation
+            observation, _ = env.reset()
+        observations[i] = observation
+        results.append((reward, terminated, truncated, info))
+    return results
+
+
+def worker(remote, env_fns, indices, shared_name, num_envs):
+    """Worker process of VectorFPLEnv
+    """
+    shared = shared_memory.SharedMemory(name=shared_name)
+    observations = np.ndarray((num_envs, OBSERVATION_SIZE), dtype=np.float32, buffer=shared.buf)
+    envs = [env_fn() for env_fn in env_fns]
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                remote.send(step_envs(envs, data, observations, indices))
+            elif command == "reset":
+                infos = []
+                for env, i in zip(envs, indices):
+                    observations[i], info = env.reset()
+                    infos.append(info)
+                remote.send(infos)
+            elif command == "close":
+                break
+    finally:
+        del observations
+        shared.close()
+        remote.close()
@@ -1,56 +1,259 @@
 """Here, we implement the rules of Fantasy Premier League
 """
 
+import logging
+import numpy as np
+from season_data import load_season
+from profiling import timed
 
+logger = logging.getLogger(__name__)
+
+
+# accepted formations 4-3-3, 4-4-2, 4-5-1, 3-4-3, 3-5-2, given by the
+# sorted position ids of the bench players
+VALID_BENCH_POSITIONS = [[1, 2, 3, 3],
+                         [1, 2, 3, 4],
+                         [1, 2, 4, 4],
+                         [1, 2, 2, 3],
+                         [1, 2, 2, 4]]
+
+# the same formations as bench counts per position id (index)
+VALID_BENCH_COUNTS = {tuple(np.bincount(positions, minlength=5)) for positions in VALID_BENCH_POSITIONS}
+
+MAX_PLAYERS_PER_CLUB = 3
+
+# minimum number of starting players of each position id (index)
+# that auto substitutions have to keep: 1 GK, 3 DEF, 2 MID, 1 FWD
+MIN_STARTING = np.array([0, 1, 3, 2, 1])
+
+
+@timed("validate_team")
 def validate_team(team, budget, gameweek):
     """Check if team follows the Fantasy PL rules:
         - Accepted formations are 4-3-3, 4-4-2, 4-5-1, 3-4-3, 3-5-2
         - Maximum three players from each club is allowed
         - The total price of players cannot exceed 100M
     """
-
-    def validate_formation(team):
-        """Validate formation. Accepted formations are 4-3-3, 4-4-2, 
-        4-5-1, 3-4-3, 3-5-2. 
+    state = SquadState.from_team(team, gameweek, budget)
+
+    assert state.valid_formation(), "Formation not approved!"
+    logger.info("Formation approved")
+
+    assert state.valid_clubs(), "Found more than three players from a team"
+    logger.info("Player teams approved")
+
+    assert state.valid_cost(), "Budget exceeded"
+    logger.info("Team cost is within budget")
+
+
+def auto_substitutions(minutes, positions, bench):
+    """Apply the automatic substitutions to many squads and gameweeks at
+    once. Bench players who played replace starting players who did not
+    play, in the order of the bench. A keeper can only be replaced by a
+    keeper, and a substitution is skipped if the starting team would get
+    fewer players of a position than MIN_STARTING.
+
+    Parameters:
+    ----------
+    minutes : ndarray
+        minutes played by the squad players, of shape (..., 15)
+    positions : ndarray
+        position ids of the squad players, broadcastable to minutes
+    bench : ndarray
+        positions of the bench players in the squad, in bench order,
+        of shape (..., 4)
+
+    Returns:
+    --------
+    starting : ndarray
+        boolean mask of shape (..., 15) of the final starting players
+    """
+    minutes, positions = np.broadcast_arrays(minutes, positions)
+    shape = minutes.shape
+    bench = np.broadcast_to(bench, shape[:-1] + (4,)).reshape(-1, 4)
+    positions = positions.reshape(-1, 15)
+    played = minutes.reshape(-1, 15) > 0
+    rows = np.arange(len(positions))
+
+    starting = np.ones(positions.shape, dtype=bool)
+    starting[rows[:, None], bench] = False
+    if (played | ~starting).all():
+        return starting.reshape(shape)
+    counts = np.stack([(starting & (positions == i)).sum(axis=1) for i in range(5)], axis=1)
+
+    for substitute in bench.T:
+        sub_position = positions[rows, substitute]
+        # starting players that did not play and can be replaced
+        candidates = starting & ~played & played[rows, substitute, None]
+        candidates &= (positions == 1) == (sub_position == 1)[:, None]
+        candidates &= ((positions == sub_position[:, None])
+                       | (np.take_along_axis(counts, positions, axis=1) > MIN_STARTING[positions]))
+
+        substituted = candidates.any(axis=1)
+        out = candidates.argmax(axis=1)[substituted]
+        sub = substitute[substituted]
+        rows_sub = rows[substituted]
+        starting[rows_sub, out] = False
+        starting[rows_sub, sub] = True
+        counts[rows_sub, positions[rows_sub, out]] -= 1
+        counts[rows_sub, positions[rows_sub, sub]] += 1
+    return starting.reshape(shape)
+
+
+class SquadState:
+    """Position counts, club counts and cost of a squad, kept up to
+    date when players are transferred or substituted. A single transfer
+    or substitution is checked in constant time from these aggregates,
+    without validating all 15 players again.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    rows : list
+        rows of the 15 players in the season's statistics
+    bench : list
+        positions of the 4 bench players in rows
+    gameweek : int
+        gameweek deciding the player prices
+    budget : int
+        maximum total cost of the squad
+    root : str
+        data root. season_data.stats_dir by default
+    """
+    def __init__(self, season, rows, bench, gameweek, budget=1000, root=None):
+        data = load_season(season, root)
+        stats, stat_index = data.gameweek_stats()
+        self.season = season
+        self.gameweek = gameweek
+        self.budget = budget
+
+        # per player (row) lookups
+        self.prices = stats[gameweek, :, stat_index['value']]
+        self.position_ids = data.position_ids
+        self.club_ids = data.club_ids
+
+        self.rows = [int(row) for row in rows]
+        self.bench = [int(slot) for slot in bench]
+        self.members = set(self.rows)
+        positions = self.position_ids[self.rows]
+        self.bench_counts = np.bincount(positions[self.bench], minlength=5)
+        self.club_counts = np.bincount(self.club_ids[self.rows], minlength=self.club_ids.max() + 1)
+        self.cost = self.prices[self.rows].sum()
+
+    @classmethod
+    def from_team(cls, team, gameweek, budget=1000):
+        """Create the state of a Team object
         """
-        valid_bench_positions = [[1, 2, 3, 3],
-                                 [1, 2, 3, 4],
-                                 [1, 2, 4, 4],
-                                 [1, 2, 2, 3],
-                                 [1, 2, 2, 4]]
-        bench_positions = []
-        for player in team.bench:
-            bench_positions.append(player.get_player_position_id(team.season))
-        assert sorted(bench_positions) in valid_bench_positions, "Formation not approved!"
-        print("Formation approved")
+        squad = team.squad
+        return cls(team.season, squad.rows, squad.bench, gameweek, budget)
 
-    def validate_player_team(team):
-        """Maximum three players can be picked from each team
+    def valid_formation(self):
+        """Check if the starting players form an accepted formation
         """
-        team_ids = team.get_team_ids()
-        team_count = {i:team_ids.count(i) for i in team_ids}
-        for duplicates in team_count.values():
-            assert duplicates <= 3, "Found more than three players from a team"
-        print("Player teams approved")
+        return tuple(self.bench_counts) in VALID_BENCH_COUNTS
 
-    def validate_player_costs(team, budget, gameweek):
+    def valid_clubs(self):
+        """Check that no club has more than MAX_PLAYERS_PER_CLUB players
         """
+        return self.club_counts.max() <= MAX_PLAYERS_PER_CLUB
+
+    def valid_cost(self):
+        """Check that the squad cost is within the budget
         """
-        total_cost = team.get_team_cost_gameweek(gameweek)
-        assert total_cost <= budget, "Budget exceeded"
-        print("Team cost is within budget")
+        return self.cost <= self.budget
 
-    validate_formation(team)
-    validate_player_team(team)
-    validate_player_costs(team, budget, gameweek)
+    def check_transfer(self, slot, row):
+        """Check if the player in the given slot can be replaced by
+        the player of the given row. The squad composition requires
+        the new player to have the same position, and players without
+        a price in the gameweek cannot be bought
+        """
+        old = self.rows[slot]
+        if row in self.members or self.position_ids[row] != self.position_ids[old]:
+            return False
+        if self.prices[row] <= 0:
+            return False
+        club = self.club_ids[row]
+        if self.club_counts[club] - (self.club_ids[old] == club) >= MAX_PLAYERS_PER_CLUB:
+            return False
+        return self.cost - self.prices[old] + self.prices[row] <= self.budget
+
+    def transfer(self, slot, row):
+        """Replace the player in the given slot by the player of the
+        given row, and update the aggregates
+        """
+        assert self.check_transfer(slot, row), "Illegal transfer"
+        old = self.rows[slot]
+        self.members.remove(old)
+        self.members.add(row)
+        self.rows[slot] = row
+        self.club_counts[self.club_ids[old]] -= 1
+        self.club_counts[self.club_ids[row]] += 1
+        self.cost += self.prices[row] - self.prices[old]
+
+    def legal_transfers(self):
+        """Get all legal single transfers at once.
+
+        Returns:
+        --------
+        mask : ndarray
+            boolean array of shape (15, players), where mask[slot, row]
+            tells if the player in the slot can be replaced by the
+            player of the given row (see check_transfer). Players
+            without a price in the gameweek cannot be bought
+        """
+        rows = np.array(self.rows)
+        old_positions = self.position_ids[rows]
+        old_clubs = self.club_ids[rows]
+        old_prices = self.prices[rows]
+
+        mask = self.position_ids[None, :] == old_positions[:, None]
+        club_counts = self.club_counts[self.club_ids][None, :] - (self.club_ids[None, :] == old_clubs[:, None])
+        mask &= club_counts < MAX_PLAYERS_PER_CLUB
+        mask &= self.cost - old_prices[:, None] + self.prices[None, :] <= self.budget
+        mask &= self.prices[None, :] > 0
+        mask[:, rows] = False
+        return mask
+
+    def check_substitution(self, slot, bench_slot):
+        """Check if the starting player in the given slot can swap
+        places with the bench player in the given slot without
+        breaking the formation
+        """
+        if slot in self.bench or bench_slot not in self.bench:
+            return False
+        position_in = self.position_ids[self.rows[bench_slot]]
+        position_out = self.position_ids[self.rows[slot]]
+        if position_in == position_out:
+            return True
+        counts = self.bench_counts.copy()
+        counts[position_in] -= 1
+        counts[position_out] += 1
+        return tuple(counts) in VALID_BENCH_COUNTS
+
+    def substitute(self, slot, bench_slot):
+        """Swap the starting player in the given slot with the bench
+        player in the given slot, and update the aggregates
+        """
+        assert self.check_substitution(slot, bench_slot), "Formation not approved!"
+        self.bench[self.bench.index(bench_slot)] = slot
+        self.bench_counts[self.position_ids[self.rows[bench_slot]]] -= 1
+        self.bench_counts[self.position_ids[self.rows[slot]]] += 1
 
 
 def get_number_of_transfers(team1, team2):
-    changes = list(set(team1.player_ids) - set(team2.player_ids))
+    """Number of players in team1 that are not in team2
+    """
+    changes = list(set(team1.get_player_rows()) - set(team2.get_player_rows()))
     return len(changes)
 
 def display_all_changes(team1, team2):
-    changes = list(set(team1.player_ids) - set(team2.player_ids))
+    """Names of the players in team1 that are not in team2
+    """
+    old_rows = set(team2.get_player_rows())
+    changes = [player.name for player, row in zip(team1.players, team1.get_player_rows())
+               if row not in old_rows]
     return changes
 
 
@@ -114,47 +317,89 @@ class FPL:
             assert self.bench_boost_played is False, "Bench boost is already played"
             self.bench_boost_played = True
 
-    def auto_substitute(self):
-        """Auto substitute players with bench players
+    def legal_actions(self, allow_hits=True):
+        """Get the legal actions before the current gameweek, such that
+        an agent can pick among them instead of trying actions.
+
+        Parameters:
+        ----------
+        allow_hits : bool
+            if False, no transfers are legal when there are no free
+            transfers left
+
+        Returns:
+        --------
+        transfers : ndarray
+            boolean mask of shape (15, players) over (player out, player
+            in) pairs, see SquadState.legal_transfers. The players out
+            are ordered as self.team.players
+        chips : ndarray
+            boolean mask of the chips that can be played, ordered as
+            self.chips
+        hit : int
+            points deducted for the next transfer
         """
-        substitute = True
-        while substitute:
-            team_old = self.team
-            substitute = self.team.auto_substitute(self.gameweek)
-            try:
-                validate_team(team, self.money_bank, self.gameweek)
-            except AssertionError:
-                self.team = team_old
+        state = SquadState.from_team(self.team, self.gameweek, self.money_bank)
+        transfers = state.legal_transfers()
+        hit = 0 if self.free_transfers > 0 else self.TRANSFER_COST
+        if hit and not allow_hits:
+            transfers[:] = False
+        return transfers, self.available_chips(), hit
+
+    def available_chips(self):
+        """Get the boolean mask of the chips that can be played, ordered
+        as self.chips
+        """
+        played = [self.wildcard_played, self.free_hit_played,
+                  self.triple_cap_played, self.bench_boost_played]
+        return ~np.array(played) & (sum(self.chips) == 0)
 
-    def compute_gameweek_points(self):
+    def auto_substitute(self):
+        """Auto substitute players with bench players. Returns the
+        mask of the players in self.team.players that start after
+        the substitutions
         """
+        return self.team.auto_substitute(self.gameweek)
+
+    @timed("FPL.compute_gameweek_points")
+    def compute_gameweek_points(self, starting=None):
+        """Compute the points of the team in the current gameweek. The
+        armband goes to the vice captain if the captain does not play.
+
+        Parameters:
+        ----------
+        starting : ndarray
+            mask of the starting players in self.team.players. The
+            players that are not on the bench by default
         """
+        if starting is None:
+            starting = self.team.squad.starting
+        player_points = self.team.get_gameweek_stat('total_points', self.gameweek)
+        played = self.team.get_gameweek_stat('minutes', self.gameweek) > 0
         if self.chips[3] is True:
-            players_loop = self.team.players
+            counted = np.ones(len(player_points), dtype=bool)
         else:
-            players_loop = self.team.out_players
+            counted = starting
 
-        points = 0
-        for player in players_loop:
-            points += player.get_gameweek_points(self.team.season, self.gameweek)
+        points = player_points[counted].sum()
         factor = 1 + self.chips[2]
-        if self.team.captain in self.team.out_players:
-            points += factor * self.team.captain.get_gameweek_points(self.team.season, self.gameweek)
-        elif self.team.vice_captain in self.team.out_players:
-            points += factor * self.team.vice_captain.get_gameweek_points(self.team.season, self.gameweek)
-        return points
+        captain = self.team.squad.captain
+        vice_captain = self.team.squad.vice_captain
+        if counted[captain] and played[captain]:
+            points += factor * player_points[captain]
+        elif counted[vice_captain] and played[vice_captain]:
+            points += factor * player_points[vice_captain]
+        return int(points)
 
     def next_gameweek(self):
         """Enter next gameweek. This starts with computing the number of
         points from the last gameweek
         """
         # calculate points
-        team_before_sub = self.team
-        self.auto_substitute()
-        points = self.compute_gameweek_points()
-        print(f"Total points from last gameweek was {points}.")
+        starting = self.auto_substitute()
+        points = self.compute_gameweek_points(starting)
+        logger.info("Total points from last gameweek was %d.", points)
         self.total_points += points
-        self.team = team_before_sub
 
         # move on to next gameweek
         self.gameweek += 1
@@ -169,17 +414,29 @@ class FPL:
         if self.gameweek == self.NEW_WILDCARD_GAMEWEEK:
             self.wildcard_played = False
         if self.gameweek > self.GAMEWEEKS:
-            print("Game is over")
+            logger.info("Game is over")
         self.chips = [False, False, False, False]
 
-    def perform_actions(team, chips):
-        """Update team and play chips
+    def perform_actions(self, team, chips, checked=False):
+        """Update team and play chips. The transfer cost is deducted
+        from the total points and returned.
+
+        Parameters:
+        ----------
+        team : Team
+            the team of the gameweek
+        chips : list
+            the chips played, ordered as self.chips
+        checked : bool
+            the transfers to team are already checked, for instance by
+            SquadState.check_transfer, so validate_team is skipped
         """
         self.old_team = self.team
         self.team = team
         self.chips = chips
         self.update_chips()
-        validate_team(team)
+        if not checked:
+            validate_team(team, self.money_bank, self.gameweek)
 
         # compute transfer costs
         num_transfers = get_number_of_transfers(self.team, self.old_team)
@@ -188,7 +445,10 @@ class FPL:
         self.free_transfers = max(0, self.free_transfers - num_transfers)
 
         total_transfer_cost = self.TRANSFER_COST * num_nonfree_transfers
-        print(f"{num_transfers} transfers made at a cost of {total_transfer_cost}")
+        self.total_transfers += num_transfers
+        self.total_points -= total_transfer_cost
+        logger.info("%d transfers made at a cost of %d", num_transfers, total_transfer_cost)
+        return total_transfer_cost
 
 
 if __name__ == "__main__":
@@ -199,6 +459,8 @@ if __name__ == "__main__":
 
     from players import Player
     from team import Team
+    from logs import setup_logging
+    setup_logging()
 
     season = "2020-21"
 
@@ -1,48 +1,72 @@
 import os
 import glob
+import logging
 import torch
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import torch.nn as nn
+from training import train_model
+import season_data
+from season_data import load_season
+from squad_optimizer import optimize_squad
+from csv_loader import iter_csvs, player_folders, find_folder
+from logs import setup_logging
+
+logger = logging.getLogger(__name__)
 
 
 class InitialRound:
 
     BUDGET = 1000
+    # features of the previous season, see collect_player_history
+    PLAYER_FEATURES = ["assists", "bonus", "bps", "clean_sheets", "creativity", "element_code", "end_cost", "goals_conceded", "goals_scored", "ict_index", "influence", "minutes", "own_goals", "penalties_missed", "penalties_saved", "red_cards", "saves", "start_cost", "threat", "total_points", "yellow_cards"]
 
     def __init__(self):
         pass
 
-    def collect_player_history(self):
-        print("Collecting player history...")
+    def collect_player_history(self, workers=None):
+        logger.info("Collecting player history...")
         seasons = ["2016-17", "2017-18", "2018-19", "2019-20"]
-        player_features = ["assists", "bonus", "bps", "clean_sheets", "creativity", "element_code", "end_cost", "goals_conceded", "goals_scored", "ict_index", "influence", "minutes", "own_goals", "penalties_missed", "penalties_saved", "red_cards", "saves", "start_cost", "threat", "total_points", "yellow_cards"]
-        path = "/home/evenmn/Fantasy-Premier-League/data/{}/players/"
-        x, t = [], []
-        for i in tqdm(range(len(seasons) - 1)):
-            players = next(os.walk(path.format(seasons[i])))[1]
+        path = season_data.data_dir() + "{}/players/"
+
+        # match players of consecutive seasons by name, listing every
+        # season folder once
+        pairs = []
+        for i in range(len(seasons) - 1):
+            players = player_folders(path.format(seasons[i]))
+            histories = player_folders(path.format(seasons[i]), "history.csv")
+            gameweeks = player_folders(path.format(seasons[i+1]), "gw.csv")
             for player in players:
                 splitted = player.split("_")
                 name_only = "_".join(splitted[:2])
-                path1 = path.format(seasons[i]) + name_only + "*/history.csv"
-                path2 = path.format(seasons[i+1]) + name_only + "*/gw.csv"
-                try:
-                    data1 = pd.read_csv(glob.glob(path1)[-1])
-                    data2 = pd.read_csv(glob.glob(path2)[-1])
-                    x.append(list(data1[player_features].iloc[-1]))
-                    t.append(data2["total_points"].iloc[0])
-                except IndexError:
-                    continue
+                folder1 = find_folder(histories, name_only)
+                folder2 = find_folder(gameweeks, name_only)
+                if folder1 is not None and folder2 is not None:
+                    pairs.append((path.format(seasons[i]) + folder1 + "/history.csv",
+                                  path.format(seasons[i+1]) + folder2 + "/gw.csv"))
+
+        files = list(dict.fromkeys(file for pair in pairs for file in pair))
+        datas = dict(zip(files, tqdm(iter_csvs(files, workers), total=len(files),
+                                        disable=not logger.isEnabledFor(logging.INFO))))
+        x, t = [], []
+        for path1, path2 in pairs:
+            try:
+                features = list(datas[path1][self.PLAYER_FEATURES].iloc[-1])
+                points = datas[path2]["total_points"].iloc[0]
+            except IndexError:
+                continue
+            x.append(features)
+            t.append(points)
         return np.asarray(x, dtype=float), np.asarray(t, dtype=int).reshape(len(x), 1)
 
     def collect_player_history_raw(self):
-        print("Collecting player history...")
+        logger.info("Collecting player history...")
         seasons = ["2016-17", "2017-18", "2018-19", "2019-20"]
         player_features = ["assists", "bonus", "bps", "chance_of_playing_next_round", "chance_of_playing_this_round", "clean_sheets", "cost_change_event", "cost_change_event_fall", "cost_change_start", "cost_change_start_fall", "creativity", "dreamteam_count","ea_index", "element_type", "ep_next", "ep_this", "event_points", "form", "goals_conceded", "goals_scored", "ict_index", "id", "in_dreamteam", "influence", "loaned_in", "loaned_out", "loans_in", "loans_out", "minutes", "now_cost", "own_goals", "penalties_missed", "penalties_saved", "points_per_game", "red_cards", "saves", "selected_by_percent", "special", "squad_number", "status", "team", "team_code", "threat", "total_points", "transfers_in", "transfers_in_event", "transfers_out", "transfers_out_event", "value_form", "value_season", "yellow_cards"]
-        path = "/home/evenmn/Fantasy-Premier-League/data/{}/players_raw.csv"
+        path = season_data.data_dir() + "{}/players_raw.csv"
         x, t = [], []
-        for i in tqdm(range(len(seasons) - 1)):
+        for i in tqdm(range(len(seasons) - 1), disable=not logger.isEnabledFor(logging.INFO)):
             data1 = pd.read_csv(path.format(seasons[i]))
             for line in data1[player_features]:
                 name = line["first_name"] + "_" + line["second_name"]
@@ -57,8 +81,7 @@ class InitialRound:
 
     def gen_train_test(self, test=0.2):
         x, t = self.collect_player_history_raw()
-        print(x.shape)
-        print(t.shape)
+        logger.debug("Inputs: %s, targets: %s", x.shape, t.shape)
         num_test = int(len(x) * test)
         num_train = int(len(x) - num_test)
         x_train = x[:num_train]
@@ -71,34 +94,17 @@ class InitialRound:
         self.model = nn.Sequential(*modules)
         return self.model
 
-    def train_torch(self, x, t, lr, max_iter):
-        """Train the neural network model.
+    def train_torch(self, x, t, lr, max_iter, batch_size=256, **kwargs):
+        """Train the neural network model on mini-batches for at most
+        max_iter epochs. See training.train_model for the options
         """
-        print("\nTraining...")
-        # Get data
-        x = torch.tensor(x)
-        t = torch.tensor(t)
-
-        # Define loss and optimizer
-        loss_func = nn.MSELoss()
-        optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
-
-        # Train network
-        for epoch in range(max_iter):
-            # Forward propagation
-            y = self.model(x.float())
-            loss = loss_func(y, t.float())
-            print("epoch: ", epoch, " loss: ", loss.item())  # Zero the gradients
-            optimizer.zero_grad()
-
-            # Backward propagation
-            loss.backward()   # perform a backward pass (backpropagation)
-            optimizer.step()  # update parameters
+        logger.info("Training...")
+        return train_model(self.model, x, t, lr, max_iter, batch_size, **kwargs)
 
     def test(self, x, t):
         """
         """
-        print("\nTesting...")
+        logger.info("Testing...")
         # Get data
         x = torch.tensor(x)
         t = torch.tensor(t)
@@ -107,11 +113,11 @@ class InitialRound:
         y = self.model(x.float())
         loss_func = nn.MSELoss()
         loss = loss_func(y, t.float())
-        print(float(loss))
+        logger.info("Test loss: %.4f", float(loss))
 
     def predict(self, season):
-        print("\nPredicting scores...")
-        path = "/home/evenmn/Fantasy-Premier-League/data/{}/players/"
+        logger.info("Predicting scores...")
+        path = season_data.data_dir() + "{}/players/"
         players = next(os.walk(path.format(season)))[1]
 
         names = []
@@ -132,72 +138,86 @@ class InitialRound:
                 continue
         return names, predicted_points
 
-    def select_initial_squad(self, formation="2-5-5-3", season="2020-21"):
-        formation_split = np.asarray(formation.split("-"), dtype=int)
-        formation_split = np.insert(formation_split, 0, 1)
-
-        num_teams = 20
-
-        names, predicted_points = self.predict(season)
-        names = np.asarray(names, dtype=str)
-        predicted_points = np.asarray(predicted_points, dtype=float)
-        sorted = np.argsort(predicted_points)
-
-        print("\nSelecting squad...")
-        path = "/home/evenmn/Fantasy-Premier-League/data/{}/players_raw.csv"
-        data = pd.read_csv(path.format(season))
-        players = [[] for _ in range(len(formation_split))]
-        points = [[] for _ in range(len(formation_split))]
-        total_points = []
-        squad_price = 0
-        players_teams = np.zeros(num_teams)
-
-        # finding points per price
-        players_sorted, cost, points_per_price, points = [], [], [], []
-        for i in sorted[::-1]:
-            name = names[i]
-            name_split = name.split("_")
-            j = 0
-            for f, s in zip(data["first_name"], data["second_name"]):
-                if f == name_split[0] and s == name_split[1]:
-                    price = data["now_cost"].iloc[j]
-                    point = predicted_points[i]
-                    cost.append(price)
-                    points.append(point)
-                    players_sorted.append(name)
-                    points_per_price.append(point / price)
-
-        argsorted = np.argsort(points_per_price)
-        for i in argsorted[::-1]:
-            name = players_sorted[i]
-            name_split = name.split("_")
-            j = 0
-            for f, s in zip(data["first_name"], data["second_name"]):
-                if f == name_split[0] and s == name_split[1]:
-                    position = data["element_type"].iloc[j]
-                    new_price = squad_price + cost[i]
-                    team = data["team"].iloc[j]
-                    if len(players[position-1]) < formation_split[position-1] and new_cost < self.BUDGET and players_teams[team-1] < 3:
-                        players[position-1].append(name)
-                        total_points.append(points[i])
-                        points[position-1].append(int(points[i]))
-                        squad_price = new_price
-                        players_teams[team-1] += 1
-                j += 1
-        print(f"Total team cost: {cost/10:1f}")
-        print(players)
-        print(points)
-        print(sum(total_points))
+    def predict_batch(self, season, workers=None):
+        """Predict the points of all players of a season in the first
+        gameweek, with one forward pass over the previous season
+        summaries in the season's history.csv files (see
+        SeasonData.player_histories). Players without history, or with
+        missing features, are left out
+
+        Returns:
+        --------
+        predictions : DataFrame
+            columns player_id, name and predicted_points
+        """
+        data = load_season(season)
+        histories = data.player_histories(workers)
+        x = histories.reindex(columns=self.PLAYER_FEATURES).to_numpy(dtype=np.float32)
+        known = ~np.isnan(x).any(axis=1)
+        with torch.inference_mode():
+            predicted_points = self.model(torch.from_numpy(x[known]))[:, 0].numpy()
+
+        ids = histories['id'].to_numpy()[known]
+        full_names = (data.players_raw['first_name'] + " " + data.players_raw['second_name']).tolist()
+        names = [full_names[data.player_rows[id]] if id in data.player_rows else None for id in ids]
+        return pd.DataFrame({"player_id": ids, "name": names,
+                             "predicted_points": predicted_points.astype(float)})
+
+    def select_initial_squad(self, formation="2-5-5-3", season="2020-21", bench_weight=0.0):
+        """Select the initial squad with the most predicted points,
+        see squad_optimizer.optimize_squad
+
+        Parameters:
+        ----------
+        formation : str
+            number of keepers, defenders, midfielders and forwards
+        season : str
+            season name ('2019-20' and so on)
+        bench_weight : float
+            weight of the predicted points of the bench players
+
+        Returns:
+        --------
+        squad : OptimalSquad
+            with squad holding the player rows of players_raw
+        """
+        composition = tuple(int(number) for number in formation.split("-"))
+        predictions = self.predict_batch(season)
+
+        logger.info("Selecting squad...")
+        data = load_season(season)
+        predictions = predictions[predictions["player_id"].isin(data.player_rows)]
+        rows = np.array([data.player_rows[id] for id in predictions["player_id"]], dtype=int)
+        players_raw = data.players_raw.iloc[rows]
+        result = optimize_squad(predictions["predicted_points"].to_numpy(), players_raw["now_cost"].to_numpy(),
+                                players_raw["element_type"].to_numpy(), players_raw["team"].to_numpy(),
+                                self.BUDGET, composition, bench_weight)
+
+        names = (players_raw["first_name"] + "_" + players_raw["second_name"]).to_numpy()
+        predicted_points = predictions["predicted_points"].to_numpy()
+        positions = players_raw["element_type"].to_numpy()
+        players = [[] for _ in range(len(composition))]
+        points = [[] for _ in range(len(composition))]
+        for i in result.squad:
+            players[positions[i]-1].append(names[i])
+            points[positions[i]-1].append(int(predicted_points[i]))
+        logger.info("Total team cost: %.1f", result.cost / 10)
+        logger.info("Captain: %s, vice captain: %s", names[result.squad[result.captain]],
+                    names[result.squad[result.vice_captain]])
+        logger.info("Bench: %s", " ".join(names[result.squad[result.bench]]))
+        logger.debug("Players: %s", players)
+        logger.debug("Predicted points: %s", points)
+        logger.info("Expected points: %.1f", result.points)
 
         self.display_team(players, points)
+        return result._replace(squad=rows[result.squad])
 
     def display_team(self, players, points):
-        print("\n\n\n")
-        for position in players:
-            print(" ".join(position), end="\n\n")
+        logger.info("\n\n\n%s\n", "\n\n".join(" ".join(position) for position in players))
 
 
 if __name__ == "__main__":
+    setup_logging()
     init = InitialRound()
 
     x_train, t_train, x_test, t_test = init.gen_train_test()
@@ -0,0 +1,32 @@
+"""
+Logging setup. The modules of the game log through loggers named after
+the modules, and nothing is shown until logging is set up, for instance
+by the scripts:
+
+    setup_logging()            # progress messages, as before
+    setup_logging(quiet=True)  # batch runs, only warnings and errors
+
+The level can also be given by the FPL_LOG_LEVEL environment variable
+(DEBUG, INFO, WARNING, ...).
+"""
+
+import os
+import sys
+import logging
+
+
+def setup_logging(level=None, quiet=False):
+    """Send the log messages of the game to standard output.
+
+    Parameters:
+    ----------
+    level : int or str
+        lowest level shown. FPL_LOG_LEVEL, or INFO, by default
+    quiet : bool
+        only show warnings and errors, for batch runs
+    """
+    if quiet:
+        level = logging.WARNING
+    elif level is None:
+        level = os.environ.get("FPL_LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(stream=sys.stdout, format="%(message)s", level=level, force=True)
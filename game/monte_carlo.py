@@ -0,0 +1,196 @@
+"""
+Monte Carlo season simulation. Instead of replaying the actual points
+of a season, the (points, minutes) outcome of every player in every
+gameweek is drawn from the outcomes of that player in the historical
+gameweeks, and thousands of seasons are scored per squad, vectorized
+over the samples. The samples are split in chunks with independent
+random streams (spawned from one SeedSequence), such that the results
+only depend on the seed and not on the number of worker processes.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from season_data import load_season
+from game_rules import FPL
+from simulator import per_gameweek, transfer_hits, score_squads
+
+
+# squads times samples scored at once by simulate_chunk, which bounds
+# the memory used when many squads are compared
+BLOCK_SIZE = 10000
+
+MonteCarloResult = namedtuple("MonteCarloResult", ["totals", "percentiles", "mean", "std",
+                                                   "mean_rank", "best_probability"])
+MonteCarloResult.__doc__ = """Result of monte_carlo_season. totals holds the
+sampled season totals of shape (squads, samples) and percentiles the
+percentiles of the totals of shape (squads, len(q)). mean_rank is the
+average rank of each squad among the squads (1 is best) and
+best_probability the fraction of samples in which it ranks first"""
+
+
+def fit_outcomes(season, gameweeks=None):
+    """Get the historical outcomes of every player, from which the
+    simulated gameweeks are sampled. A gameweek without an appearance
+    counts as an outcome with no points and no minutes.
+
+    Parameters:
+    ----------
+    season : str
+        season name
+    gameweeks : list
+        gameweeks (1, 2, ...) to fit on. All gameweeks by default
+
+    Returns:
+    --------
+    points, minutes : ndarray
+        float32 arrays of shape (outcomes, players)
+    """
+    stats, stat_index = load_season(season).gameweek_stats()
+    if gameweeks is None:
+        gameweeks = range(1, stats.shape[0])
+    gameweeks = list(gameweeks)
+    return (stats[gameweeks, :, stat_index['total_points']],
+            stats[gameweeks, :, stat_index['minutes']])
+
+
+def simulate_chunk(seed, samples, points, minutes, squads, positions, bench, captain,
+                   vice_captain, chips):
+    """Score the squads over a chunk of sampled seasons.
+
+    Parameters:
+    ----------
+    seed : SeedSequence
+        seed of the random stream of the chunk
+    samples : int
+        number of seasons
+    points, minutes : ndarray
+        outcomes of shape (outcomes, players), see fit_outcomes, only
+        for the players in squads
+    squads : ndarray
+        indices into the outcome columns, of shape (squads, gameweeks, 15)
+
+    Returns:
+    --------
+    points : ndarray
+        points before hits, of shape (squads, samples)
+    """
+    rng = np.random.default_rng(seed)
+    num_squads, gameweeks = squads.shape[:2]
+    players = points.shape[1]
+    draw = rng.integers(0, len(points), size=(samples, gameweeks, players))
+    columns = np.arange(players)
+    sampled_points = points[draw, columns]
+    sampled_minutes = minutes[draw, columns]
+
+    # (samples, squads, gameweeks, 15) for every squad player, a block
+    # of squads at a time
+    gw = np.arange(gameweeks)[None, :, None]
+    block = max(1, BLOCK_SIZE // samples)
+    totals = np.empty((num_squads, samples), dtype=points.dtype)
+    for start in range(0, num_squads, block):
+        part = slice(start, start + block)
+        shape = (samples,) + captain[part].shape
+        scores = score_squads(sampled_points[:, gw, squads[part]], sampled_minutes[:, gw, squads[part]],
+                              positions[part], bench[part], np.broadcast_to(captain[part], shape),
+                              np.broadcast_to(vice_captain[part], shape), chips[part])
+        totals[part] = scores.sum(axis=-1).T
+    return totals
+
+
+def rank_squads(totals):
+    """Rank the squads in every sample, 1 being the best. Tied squads
+    share the best rank of the tie. Sorting each sample keeps the memory
+    linear in the number of squads.
+
+    Parameters:
+    ----------
+    totals : ndarray
+        season totals of shape (squads, samples)
+
+    Returns:
+    --------
+    ranks : ndarray
+        ranks of shape (squads, samples)
+    """
+    order = np.argsort(-totals, axis=0, kind="stable")
+    ordered = np.take_along_axis(totals, order, axis=0)
+    # the rank of a squad is one plus the sorted position of the first
+    # squad with the same total
+    first = np.zeros(ordered.shape, dtype=np.int64)
+    first[1:] = np.where(ordered[1:] != ordered[:-1], np.arange(1, len(totals))[:, None], 0)
+    np.maximum.accumulate(first, axis=0, out=first)
+    ranks = np.empty_like(first)
+    np.put_along_axis(ranks, order, first + 1, axis=0)
+    return ranks
+
+
+def monte_carlo_season(season, squads, bench, captain, vice_captain, chips=None, gameweeks=None,
+                       samples=1000, seed=0, outcomes=None, q=(5, 25, 50, 75, 95),
+                       chunk_size=100, workers=None):
+    """Simulate many random seasons for many squads.
+
+    Parameters:
+    ----------
+    season : str
+        season name
+    squads, bench, captain, vice_captain, chips : ndarray
+        the squads, as taken by simulate_season
+    gameweeks : int
+        number of gameweeks per season. All gameweeks by default
+    samples : int
+        number of seasons simulated per squad
+    seed : int
+        seed of the simulation. Equal seeds give equal results
+    outcomes : tuple
+        (points, minutes) arrays of shape (outcomes, players) to sample
+        from. By default all gameweeks of the season, see fit_outcomes
+    q : tuple
+        percentiles of the season totals to compute
+    chunk_size : int
+        number of seasons sampled at once, which bounds the memory used
+    workers : int
+        number of processes. 0 or 1 runs in this process, and all
+        cores are used by default
+
+    Returns:
+    --------
+    result : MonteCarloResult
+    """
+    data = load_season(season)
+    if outcomes is None:
+        outcomes = fit_outcomes(season)
+    if gameweeks is None:
+        gameweeks = min(FPL.GAMEWEEKS, data.gameweek_stats()[0].shape[0] - 1)
+
+    squads = np.asarray(squads)
+    num_squads = len(squads)
+    squads = per_gameweek(squads, num_squads, gameweeks, 15)
+    bench = per_gameweek(bench, num_squads, gameweeks, 4)
+    captain = per_gameweek(captain, num_squads, gameweeks)[:, :, None]
+    vice_captain = per_gameweek(vice_captain, num_squads, gameweeks)[:, :, None]
+    if chips is None:
+        chips = np.zeros((num_squads, gameweeks, 4), dtype=bool)
+    chips = np.asarray(chips, dtype=bool)
+    positions = data.players_raw['element_type'].to_numpy()[squads]
+    hits = transfer_hits(squads, chips).sum(axis=1)
+
+    # only the outcomes of the squad players are sent to the workers
+    rows, index = np.unique(squads, return_inverse=True)
+    index = index.reshape(squads.shape)
+    points, minutes = (np.ascontiguousarray(array[:, rows]) for array in outcomes)
+
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(chunk_seed, size, points, minutes, index, positions, bench, captain, vice_captain, chips)
+            for chunk_seed, size in zip(seeds, sizes)]
+    if workers is not None and workers <= 1:
+        chunks = [simulate_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(simulate_chunk, *zip(*args)))
+    totals = np.concatenate(chunks, axis=1) - hits[:, None]
+
+    ranks = rank_squads(totals)
+    return MonteCarloResult(totals, np.percentile(totals, q, axis=1).T, totals.mean(axis=1),
+                            totals.std(axis=1), ranks.mean(axis=1), (ranks == 1).mean(axis=1))
@@ -12,10 +12,7 @@ Statistics are provided by Vaastav Anand's great
 Fantasy Premier League scraper.
 """
 
-import pandas as pd
-
-
-stats_dir = "~/Fantasy-Premier-League/data/"
+from season_data import load_season
 
 
 class PlayerStats:
@@ -32,7 +29,7 @@ class PlayerStats:
         assert season in [1920, 2021, 2122], "Given season is not available!"
         season = str(season)
         self.season_verb_repr = f"20{season[:2]}-{season[2:]}"
-        self.season_dir = stats_dir + self.season_verb_repr + "/"
+        self.data = load_season(self.season_verb_repr)
         # player
         self.player_id = player
         self.first_name, self.second_name = self.get_player_name()
@@ -41,27 +38,19 @@ class PlayerStats:
         """Get player name, given player ID. This is based on
         the 'season/player_idlist.csv' file
         """
-        player_idlist_file = self.season_dir + "player_idlist.csv"
-        players = pd.read_csv(player_idlist_file)
-        player_ids = players['id']
-        first_names = players['first_name']
-        second_names = players['second_name']
+        players = self.data.player_idlist
         try:
-            row_ind = player_ids.index[player_ids == self.player_id].to_list()[0]
-        except IndexError:
+            row_ind = self.data.idlist_rows[self.player_id]
+        except KeyError:
             raise IndexError(f"No player with ID {self.player_id} found!")
-        return first_names[row_ind], second_names[row_ind]
+        return players['first_name'].iat[row_ind], players['second_name'].iat[row_ind]
 
     def get_player_position_id(self):
         """Get player position id, given player ID. This is based 
         on the 'season/players_raw.csv' file
         """
-        players_raw_file = self.season_dir + "players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        position_ids = players['element_type']
-        row_ind = player_ids.index[player_ids == self.player_id].to_list()[0]
-        return position_ids[row_ind]
+        row_ind = self.data.player_rows[self.player_id]
+        return self.data.players_raw['element_type'].iat[row_ind]
 
     def get_player_position(self):
         """Get player position, given player ID. 
@@ -77,36 +66,24 @@ class PlayerStats:
         """Get the ID of team, given player ID. This is based
         on the 'season/players_raw.csv' file
         """
-        players_raw_file = self.season_dir + "players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        team_ids = players['team']
-        row_ind = player_ids.index[player_ids == self.player_id].to_list()[0]
-        return team_ids[row_ind]
+        row_ind = self.data.player_rows[self.player_id]
+        return self.data.players_raw['team'].iat[row_ind]
     
     def get_team_name(self):
         """Get team name, given player ID. This is based on the
         'season/teams.csv' file
         """
         team_id = self.get_team_id()
-        team_file = self.season_dir + "teams.csv"
-        teams = pd.read_csv(team_file)
-        team_ids = teams['id']
-        name = teams['name']
-        short_name = teams['short_name']
-        row_ind = team_ids.index[team_ids == team_id].to_list()[0]
-        return name[row_ind], short_name[row_ind]
+        teams = self.data.teams
+        row_ind = self.data.team_rows[team_id]
+        return teams['name'].iat[row_ind], teams['short_name'].iat[row_ind]
 
     def get_current_price(self):
         """Get current price of player, given player ID. This
         is based on the 'season/players_raw.csv' file
         """
-        players_raw_file = self.season_dir + "players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        now_cost = players['now_cost']
-        row_ind = player_ids.index[player_ids == self.player_id].to_list()[0]
-        return now_cost[row_ind]
+        row_ind = self.data.player_rows[self.player_id]
+        return self.data.players_raw['now_cost'].iat[row_ind]
 
 
 if __name__ == "__main__":
@@ -4,20 +4,19 @@ Python Football Fantasy
 
 import difflib
 import pandas as pd
+from season_data import stats_dir, load_season
+from profiling import timed
 
 
 ################################
 ### GET OVERVIEW OF PLAYERS
 ################################
 
-stats_dir = "~/Fantasy-Premier-League/data/"
-
 
 def list_teams(season):
     """List teams from the 'season/teams.csv' file
     """
-    teams_file = stats_dir + season + "/teams.csv"
-    teams = pd.read_csv(teams_file)
+    teams = load_season(season).teams
     ids = teams['id']
     names = teams['name']
     short_names = teams['short_name']
@@ -77,9 +76,46 @@ def search_player(player):
 
 class Player:
     """Player base class. A player is identified by his name.
+
+    The id, row, position id and team id of the player are looked up
+    the first time they are needed in a season and kept until another
+    season is asked for, such that repeated calls do not search the
+    season tables again. Players use __slots__, so a squad of them
+    takes little memory.
     """
+    __slots__ = ("name", "_season", "_id", "_row", "_position_id", "_team_id")
+
     def __init__(self, name):
         self.name = name
+        self._season = None
+
+    @classmethod
+    def from_row(cls, season, row):
+        """Create the player of a row in the 'season/players_raw.csv'
+        file. The player is resolved by row instead of by name, which
+        also works for players sharing a name with another player
+        """
+        players_raw = load_season(season).players_raw
+        player = cls(players_raw['first_name'].iat[row] + " " + players_raw['second_name'].iat[row])
+        player._set_season(season, int(players_raw['id'].iat[row]), int(row))
+        return player
+
+    def _set_season(self, season, player_id, row):
+        """Store the lookups of a season
+        """
+        data = load_season(season)
+        self._season = season
+        self._id = player_id
+        self._row = row
+        self._position_id = int(data.position_ids[row])
+        self._team_id = int(data.club_ids[row])
+
+    def _resolve(self, season):
+        """Look up the player in a season, unless already done
+        """
+        if self._season != season:
+            player_id = self.find_player_id(season)
+            self._set_season(season, player_id, load_season(season).player_rows[player_id])
 
     def __str__(self, season):
         """String representation of player
@@ -91,40 +127,46 @@ class Player:
         print(f" - {team:<16} ({team_short})")
         print("")
 
-    def get_player_id(self, season):
+    @timed("Player.find_player_id")
+    def find_player_id(self, season):
+        """Find the player ID by name in the 'season/player_idlist.csv'
+        file
         """
-        """
-        player_idlist_file = stats_dir + season + "/player_idlist.csv"
-        players = pd.read_csv(player_idlist_file)
-        ids = players['id']
-        first_name = players['first_name']
-        second_name = players['second_name']
-        full_name = players['first_name'] + " " + players['second_name']
+        name_to_id = load_season(season).name_to_id
         try:
-            row_ind = players.index[self.name == full_name].to_list()[0]
-        except IndexError:
-            matches = difflib.get_close_matches(self.name, list(full_name))
+            return name_to_id[self.name]
+        except KeyError:
+            matches = difflib.get_close_matches(self.name, list(name_to_id))
             if len(matches) > 2:
                 suggestions =  ', '.join(matches[:-1]) + ", or " + str(matches[-1])
             elif len(matches) == 2:
                 suggestions =  ' or '.join(matches)
             elif len(matches) == 1:
                 suggestions =  matches[0]
+            else:
+                raise IndexError(f"No player with name {self.name} exists")
             raise IndexError(f"No player with name {self.name} exists, did you mean {suggestions}?")
-        return ids[row_ind]
 
+    def get_player_id(self, season):
+        """Get player ID, given player name. This is based on the
+        'season/player_idlist.csv' file
+        """
+        self._resolve(season)
+        return self._id
+
+    def get_player_row(self, season):
+        """Get the row of the player in the 'season/players_raw.csv'
+        file, which also indexes the season's gameweek statistics
+        """
+        self._resolve(season)
+        return self._row
 
     def get_player_position_id(self, season):
         """Get player position id, given player ID. This is based 
         on the 'season/players_raw.csv' file
         """
-        player_id = self.get_player_id(season)
-        players_raw_file = stats_dir + season + "/players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        position_ids = players['element_type']
-        row_ind = player_ids.index[player_ids == player_id].to_list()[0]
-        return position_ids[row_ind]
+        self._resolve(season)
+        return self._position_id
 
     def get_player_position(self, season):
         """Get player position, given player ID. 
@@ -137,52 +179,45 @@ class Player:
         """Get the ID of team, given player ID. This is based
         on the 'season/players_raw.csv' file
         """
-        player_id = self.get_player_id(season)
-        players_raw_file = stats_dir + season + "/players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        team_ids = players['team']
-        row_ind = player_ids.index[player_ids == player_id].to_list()[0]
-        return team_ids[row_ind]
+        self._resolve(season)
+        return self._team_id
     
     def get_team_name(self, season):
         """Get team name, given player ID. This is based on the
         'season/teams.csv' file
         """
-        team_id = self.get_team_id(season)
-        team_file = stats_dir + season + "/teams.csv"
-        teams = pd.read_csv(team_file)
-        team_ids = teams['id']
-        name = teams['name']
-        short_name = teams['short_name']
-        row_ind = team_ids.index[team_ids == team_id].to_list()[0]
-        return name[row_ind], short_name[row_ind]
+        data = load_season(season)
+        row_ind = data.team_rows[self.get_team_id(season)]
+        return data.teams['name'].iat[row_ind], data.teams['short_name'].iat[row_ind]
 
     def get_current_price(self, season):
         """Get current price of player, given player ID. This
         is based on the 'season/players_raw.csv' file
         """
-        players_raw_file = stats_dir + season + "/players_raw.csv"
-        players = pd.read_csv(players_raw_file)
-        player_ids = players['id']
-        now_cost = players['now_cost']
-        row_ind = player_ids.index[player_ids == self.player_id].to_list()[0]
-        return now_cost[row_ind]
+        row_ind = self.get_player_row(season)
+        return load_season(season).players_raw['now_cost'].iat[row_ind]
 
+    def get_stats(self, season):
+        """Get all numeric gameweek statistics of the player, as a view
+        of shape (gameweeks + 1, stats) into the season's array, see
+        SeasonData.gameweek_stats
+        """
+        stats, stat_index = load_season(season).gameweek_stats()
+        return stats[:, self.get_player_row(season)]
 
     def get_gameweek_custom(self, keyword, season, gameweek):
+        """Get a custom statistic of the player in a certain gameweek,
+        based on the 'season/gws/gw<gameweek>.csv' file. Zero is
+        returned if the player did not play
         """
-        """
-        player_id = self.get_player_id(season)
-        gw_file = stats_dir + season + f"/gws/gw{gameweek}.csv"
-        stats = pd.read_csv(gw_file)
-        player_ids = stats['element']
-        custom = stats[keyword]
-        try:
-            row_ind = player_ids.index[player_ids == player_id].to_list()[0]
-            return custom[row_ind]
-        except IndexError:
+        data = load_season(season)
+        stats, stat_index = data.gameweek_stats()
+        if keyword in stat_index and gameweek < len(stats):
+            return stats[gameweek, self.get_player_row(season), stat_index[keyword]]
+        row_ind = data.gameweek_row(gameweek, self.get_player_id(season))
+        if row_ind is None:
             return 0
+        return data.gameweek(gameweek)[keyword].iat[row_ind]
 
 
 
@@ -227,6 +262,8 @@ class Player:
 class Goalkeeper(Player):
     """Goalkeeper class
     """
+    __slots__ = ()
+
     def get_player_position_id(self, season):
         position_id = super(Goalkeeper, self).get_player_position_id(season)
         assert position_id == 1, "Player is not a goalkeeper"
@@ -235,6 +272,8 @@ class Goalkeeper(Player):
 class Defender(Player):
     """Defender class
     """
+    __slots__ = ()
+
     def get_player_position_id(self, season):
         position_id = super(Defender, self).get_player_position_id(season)
         assert position_id == 2, "Player is not a defender"
@@ -243,6 +282,8 @@ class Defender(Player):
 class Midfielder(Player):
     """Midfielder class
     """
+    __slots__ = ()
+
     def get_player_position_id(self, season):
         position_id = super(Midfielder, self).get_player_position_id(season)
         assert position_id == 3, "Player is not a midfielder"
@@ -251,6 +292,8 @@ class Midfielder(Player):
 class Forward(Player):
     """Forward class
     """
+    __slots__ = ()
+
     def get_player_position_id(self, season):
         position_id = super(Forward, self).get_player_position_id(season)
         assert position_id == 4, "Player is not a forward"
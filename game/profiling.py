@@ -0,0 +1,134 @@
+"""
+Opt-in instrumentation of the game engine. Functions decorated with
+timed, and code blocks in a section, record their number of calls and
+cumulative wall time while a Profile is active:
+
+    with Profile() as profile:
+        game.next_gameweek()
+    profile.print_summary()
+
+When no Profile is active, a timed function only checks one global
+before calling the function, so the instrumentation can stay in place.
+"""
+
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+# the active profile, None when profiling is off
+_active = None
+
+
+class Profile:
+    """Call counts and cumulative wall times per instrumented name.
+    Profiles can be nested, the innermost one records
+    """
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        return False
+
+    def add(self, name, seconds):
+        """Record one call of name that took seconds
+        """
+        with self.lock:
+            entry = self.stats.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def table(self):
+        """Get the (name, calls, total seconds, mean seconds) of every
+        name, slowest first
+        """
+        rows = [(name, calls, total, total / calls) for name, (calls, total) in self.stats.items()]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def print_summary(self, limit=None):
+        """Print the table of the most time consuming names
+        """
+        print(f"{'name':<50} {'calls':>8} {'total (s)':>10} {'mean (ms)':>10}")
+        for name, calls, total, mean in self.table()[:limit]:
+            print(f"{name:<50} {calls:>8} {total:>10.4f} {1000 * mean:>10.4f}")
+
+    def to_json(self, path=None):
+        """Dump the table as JSON, to a file if path is given
+
+        Returns:
+        --------
+        text : str
+            the JSON document
+        """
+        text = json.dumps([{"name": name, "calls": calls, "total": total, "mean": mean}
+                           for name, calls, total, mean in self.table()], indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+def active():
+    """Get the active Profile, or None
+    """
+    return _active
+
+
+def timed(name):
+    """Decorator recording the calls of a function under name
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _active
+            if profile is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _section(profile, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+class _NoSection:
+    """Context manager doing nothing, used when profiling is off
+    """
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SECTION = _NoSection()
+
+
+def section(name):
+    """Context manager recording the time of a code block under name
+    """
+    profile = _active
+    if profile is None:
+        return _NO_SECTION
+    return _section(profile, name)
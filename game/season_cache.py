@@ -0,0 +1,145 @@
+"""
+Binary on-disk cache of parsed seasons. The arrays built by
+SeasonData are stored as .npy files next to a small JSON manifest,
+and memory-mapped when a season is loaded again. The manifest keeps
+the size and modification time of every source CSV, and a cached
+array is only used while all of its sources are unchanged.
+
+Usage:
+    python season_cache.py prepare-cache 2019-20 2020-21
+"""
+
+import os
+import re
+import json
+import argparse
+import numpy as np
+from profiling import timed
+
+
+cache_dir = "~/.cache/fantasy-pl-ai/"
+
+MANIFEST = "manifest.json"
+VERSION = 1
+
+
+def season_cache_dir(season_dir):
+    """Get the cache folder of a season folder
+    """
+    season_dir = os.path.normpath(os.path.expanduser(season_dir))
+    root, season = os.path.split(season_dir)
+    # keep seasons of different data roots apart
+    tag = root.strip(os.sep).replace(os.sep, "_")
+    return os.path.join(os.path.expanduser(cache_dir), tag, season)
+
+
+def source_files(season_dir, group):
+    """List the source files (relative to the season folder) that
+    the cached arrays of a group are built from
+    """
+    season_dir = os.path.expanduser(season_dir)
+    if group == "gameweek_stats":
+        files = ["players_raw.csv"]
+        for file in sorted(os.listdir(os.path.join(season_dir, "gws"))):
+            if re.fullmatch(r"gw(\d+)\.csv", file):
+                files.append("gws/" + file)
+        return files
+    if group == "player_gameweeks":
+        players = sorted(os.listdir(os.path.join(season_dir, "players")))
+        return ["players/" + player + "/gw.csv" for player in players
+                if os.path.isfile(os.path.join(season_dir, "players", player, "gw.csv"))]
+    raise ValueError(f"Unknown cache group {group}")
+
+
+def fingerprint(season_dir, files):
+    """Size and modification time of every file
+    """
+    season_dir = os.path.expanduser(season_dir)
+    prints = {}
+    for file in files:
+        stat = os.stat(os.path.join(season_dir, file))
+        prints[file] = [stat.st_size, stat.st_mtime_ns]
+    return prints
+
+
+def read_manifest(season_dir):
+    """Read the manifest of a season. An empty manifest is returned
+    if the season is not cached
+    """
+    path = os.path.join(season_cache_dir(season_dir), MANIFEST)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != VERSION:
+        return {}
+    return manifest
+
+
+@timed("season_cache.load")
+def load(season_dir, group):
+    """Load the cached arrays of a group, memory-mapped. None is
+    returned if the group is not cached or any source has changed.
+
+    Returns:
+    --------
+    arrays : dict
+        maps array names to read-only memory-mapped arrays
+    meta : dict
+        additional information stored with the group
+    """
+    entry = read_manifest(season_dir).get(group)
+    if entry is None:
+        return None
+    try:
+        if fingerprint(season_dir, source_files(season_dir, group)) != entry["sources"]:
+            return None
+        folder = season_cache_dir(season_dir)
+        arrays = {name: np.load(os.path.join(folder, file), mmap_mode="r")
+                  for name, file in entry["arrays"].items()}
+    except (OSError, ValueError):
+        return None
+    return arrays, entry["meta"]
+
+
+def save(season_dir, group, arrays, meta, sources):
+    """Write the arrays of a group and register them in the manifest
+    together with the fingerprint of their sources
+    """
+    folder = season_cache_dir(season_dir)
+    os.makedirs(folder, exist_ok=True)
+    files = {}
+    for name, array in arrays.items():
+        files[name] = f"{group}.{name}.npy"
+        np.save(os.path.join(folder, files[name]), np.ascontiguousarray(array))
+
+    manifest = read_manifest(season_dir)
+    manifest["version"] = VERSION
+    manifest[group] = {"arrays": files, "meta": meta, "sources": sources}
+    path = os.path.join(folder, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def prepare_cache(season, root=None):
+    """Parse all CSV files of a season and write the binary cache
+    """
+    from season_data import SeasonData
+    data = SeasonData(season, root, use_cache=False)
+    data.write_cache()
+    return season_cache_dir(data.season_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the binary season cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prepare = commands.add_parser("prepare-cache", help="convert seasons to the binary cache format")
+    prepare.add_argument("seasons", nargs="+", help="season names, e.g. 2019-20")
+    prepare.add_argument("--root", default=None, help="data folder of the scraper, ending with '/'")
+    args = parser.parse_args()
+
+    for season in args.seasons:
+        print(f"Caching {season}...")
+        print(f"Written to {prepare_cache(season, args.root)}")
@@ -0,0 +1,289 @@
+"""
+Season data store. The files provided by Vaastav Anand's scraper
+are parsed at most once per process and kept in memory, such that
+every Player, Team and FPL lookup is served without touching disk.
+"""
+
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import season_cache
+from csv_loader import iter_csvs, player_folders, read_csv
+from profiling import timed
+
+
+# root of the scraper's data folder, can be set with the FPL_DATA_DIR
+# environment variable
+stats_dir = os.path.join(os.environ.get("FPL_DATA_DIR", "~/Fantasy-Premier-League/data/"), "")
+
+# number of seasons kept in memory at once
+MAX_CACHED_SEASONS = 4
+
+
+class SeasonData:
+    """All statistics of a single season.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    root : str
+        directory containing one folder per season
+    use_cache : bool
+        read the arrays from the binary cache (see season_cache.py)
+        when it is up to date
+    """
+    def __init__(self, season, root=None, use_cache=True):
+        if root is None:
+            root = stats_dir
+        self.season = season
+        self.season_dir = root + season + "/"
+        self.use_cache = use_cache
+
+        self.player_idlist = read_csv(self.season_dir + "player_idlist.csv")
+        self.players_raw = read_csv(self.season_dir + "players_raw.csv")
+        self.teams = read_csv(self.season_dir + "teams.csv")
+        self._gameweeks = {}
+        self._gameweek_rows = {}
+        self._stats = None
+        self.stat_index = None
+        self._player_gameweeks = None
+        self._player_histories = None
+
+        # hash indexes, such that lookups do not scan the tables
+        full_names = self.player_idlist['first_name'] + " " + self.player_idlist['second_name']
+        ids = self.player_idlist['id'].tolist()
+        self.idlist_rows = first_rows(ids)
+        self.name_to_id = {name: ids[row] for name, row in first_rows(full_names.tolist()).items()}
+        self.player_rows = first_rows(self.players_raw['id'].tolist())
+        self.team_rows = first_rows(self.teams['id'].tolist())
+        # position and club id of every player row, as arrays
+        self.position_ids = self.players_raw['element_type'].to_numpy()
+        self.club_ids = self.players_raw['team'].to_numpy()
+
+    def gameweek(self, gameweek):
+        """Get the 'season/gws/gw<gameweek>.csv' table. Each
+        gameweek file is read the first time it is requested
+        """
+        try:
+            return self._gameweeks[gameweek]
+        except KeyError:
+            gw_file = self.season_dir + f"gws/gw{gameweek}.csv"
+            stats = read_csv(gw_file)
+            self._gameweeks[gameweek] = stats
+            for element, row in first_rows(stats['element'].tolist()).items():
+                self._gameweek_rows[gameweek, element] = row
+            return stats
+
+    @timed("SeasonData.gameweek_row")
+    def gameweek_row(self, gameweek, player_id):
+        """Get the row of a player in the gameweek table. None is
+        returned if the player did not appear in the gameweek
+        """
+        self.gameweek(gameweek)
+        return self._gameweek_rows.get((gameweek, player_id))
+
+    def gameweek_numbers(self):
+        """List the gameweeks available in the 'season/gws' folder
+        """
+        gameweeks = []
+        for file in os.listdir(os.path.expanduser(self.season_dir + "gws")):
+            match = re.fullmatch(r"gw(\d+)\.csv", file)
+            if match:
+                gameweeks.append(int(match.group(1)))
+        return sorted(gameweeks)
+
+    def gameweek_stats(self):
+        """Get all numeric gameweek statistics as a dense float32 array
+        indexed by [gameweek, player row, stat], where the player row
+        is the row in 'season/players_raw.csv'. Gameweek 0 is left empty
+        such that gameweeks index the array directly, and players that
+        did not appear in a gameweek have zeros for all stats.
+
+        Returns:
+        --------
+        stats : ndarray
+            array of shape (gameweeks + 1, players, stats)
+        stat_index : dict
+            maps column names of the gameweek files to stat indices
+        """
+        if self._stats is None:
+            cached = self.use_cache and season_cache.load(self.season_dir, "gameweek_stats")
+            if cached:
+                arrays, meta = cached
+                self._stats = arrays["stats"]
+                columns = meta["columns"]
+            else:
+                self._stats, columns = self.parse_gameweek_stats()
+            self.stat_index = {column: i for i, column in enumerate(columns)}
+        return self._stats, self.stat_index
+
+    def parse_gameweek_stats(self):
+        """Build the array of gameweek_stats from the 'season/gws' files
+        """
+        gameweeks = self.gameweek_numbers()
+        tables = [self.gameweek(gameweek) for gameweek in gameweeks]
+        columns = numeric_columns(tables)
+
+        shape = (max(gameweeks, default=0) + 1, len(self.players_raw), len(columns))
+        stats = np.zeros(shape, dtype=np.float32)
+        for gameweek, table in zip(gameweeks, tables):
+            # only the first row of a player counts, as in the lookups
+            table = table.drop_duplicates('element')
+            rows = table['element'].map(self.player_rows)
+            known = rows.notna().to_numpy()
+            values = table.reindex(columns=columns).apply(pd.to_numeric, errors='coerce')
+            values = values.fillna(0).to_numpy(dtype=np.float32)
+            stats[gameweek, rows[known].to_numpy(dtype=int)] = values[known]
+        return stats, columns
+
+    def player_gameweeks(self):
+        """Get the 'season/players/<player>/gw.csv' files of all players,
+        see PlayerGameweeks
+        """
+        if self._player_gameweeks is None:
+            cached = self.use_cache and season_cache.load(self.season_dir, "player_gameweeks")
+            if cached:
+                arrays, meta = cached
+                self._player_gameweeks = PlayerGameweeks(meta["players"], meta["columns"], **arrays)
+            else:
+                self._player_gameweeks = self.parse_player_gameweeks()
+        return self._player_gameweeks
+
+    def parse_player_gameweeks(self):
+        """Build PlayerGameweeks from the 'season/players' folders
+        """
+        files = season_cache.source_files(self.season_dir, "player_gameweeks")
+        tables = [read_csv(self.season_dir + file) for file in files]
+        columns = numeric_columns(tables)
+
+        offsets = np.zeros(len(tables) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(table) for table in tables])
+        values = np.zeros((offsets[-1], len(columns)), dtype=np.float64)
+        present = np.zeros((len(tables), len(columns)), dtype=bool)
+        for i, table in enumerate(tables):
+            present[i] = np.isin(columns, table.columns)
+            table = table.reindex(columns=columns).apply(pd.to_numeric, errors='coerce')
+            values[offsets[i]:offsets[i+1]] = table.to_numpy(dtype=np.float64)
+        players = [file.split("/")[1] for file in files]
+        return PlayerGameweeks(players, columns, offsets, values, present)
+
+    def player_histories(self, workers=None):
+        """Get the last row of every 'season/players/<player>/history.csv'
+        file, which summarizes the previous season of the player.
+        Players without history are left out
+
+        Returns:
+        --------
+        histories : DataFrame
+            one row per player, with the player id in the 'id' column
+        """
+        if self._player_histories is None:
+            players_dir = self.season_dir + "players/"
+            folders = player_folders(players_dir, "history.csv")
+            paths = [players_dir + folder + "/history.csv" for folder in folders]
+            rows, ids = [], []
+            for folder, history in zip(folders, iter_csvs(paths, workers)):
+                if len(history):
+                    rows.append(history.iloc[-1:])
+                    ids.append(int(folder.split("_")[-1]))
+            if rows:
+                histories = pd.concat(rows, ignore_index=True)
+            else:
+                histories = pd.DataFrame()
+            histories['id'] = ids
+            self._player_histories = histories
+        return self._player_histories
+
+    def write_cache(self):
+        """Parse the season and store its arrays in the binary cache
+        """
+        sources = season_cache.source_files(self.season_dir, "gameweek_stats")
+        fingerprint = season_cache.fingerprint(self.season_dir, sources)
+        stats, columns = self.parse_gameweek_stats()
+        season_cache.save(self.season_dir, "gameweek_stats", {"stats": stats},
+                          {"columns": columns}, fingerprint)
+
+        sources = season_cache.source_files(self.season_dir, "player_gameweeks")
+        fingerprint = season_cache.fingerprint(self.season_dir, sources)
+        player_gameweeks = self.parse_player_gameweeks()
+        arrays = {"offsets": player_gameweeks.offsets,
+                  "values": player_gameweeks.values,
+                  "present": player_gameweeks.present}
+        meta = {"players": player_gameweeks.players, "columns": player_gameweeks.columns}
+        season_cache.save(self.season_dir, "player_gameweeks", arrays, meta, fingerprint)
+
+
+class PlayerGameweeks:
+    """The 'season/players/<player>/gw.csv' files of a season, with
+    the numeric columns of all files stacked in one array.
+
+    Parameters:
+    ----------
+    players : list
+        player folder names, in the order of the stacked files
+    columns : list
+        names of the numeric columns
+    offsets : ndarray
+        the rows of player i are values[offsets[i]:offsets[i+1]]
+    values : ndarray
+        float64 array of shape (total rows, columns)
+    present : ndarray
+        present[i, j] is False if column j is missing for player i
+    """
+    def __init__(self, players, columns, offsets, values, present):
+        self.players = players
+        self.columns = columns
+        self.offsets = offsets
+        self.values = values
+        self.present = present
+        self.column_index = {column: i for i, column in enumerate(columns)}
+
+    def __len__(self):
+        return len(self.players)
+
+    def get(self, i, columns):
+        """Get the given columns of player i as an array of shape
+        (gameweeks, columns). None is returned if a column is missing
+        """
+        index = [self.column_index.get(column) for column in columns]
+        if None in index or not self.present[i, index].all():
+            return None
+        return self.values[self.offsets[i]:self.offsets[i+1], index]
+
+
+def numeric_columns(tables):
+    """Union of the numeric columns of a list of tables, in order of
+    first appearance
+    """
+    columns = []
+    for table in tables:
+        for column in table.select_dtypes(include=["number", "bool"]).columns:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def first_rows(keys):
+    """Map every key to the row of its first occurrence
+    """
+    rows = {}
+    for row, key in enumerate(keys):
+        rows.setdefault(key, row)
+    return rows
+
+
+def data_dir():
+    """Get the data root (stats_dir) with the user directory expanded
+    """
+    return os.path.expanduser(stats_dir)
+
+
+@lru_cache(maxsize=MAX_CACHED_SEASONS)
+def load_season(season, root=None):
+    """Get the data store of a season. The last MAX_CACHED_SEASONS
+    seasons requested are kept in memory
+    """
+    return SeasonData(season, root)
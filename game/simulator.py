@@ -0,0 +1,218 @@
+"""
+Vectorized season simulator. Scores many squads over all gameweeks
+of a season at once with NumPy operations over the season's gameweek
+statistics (see SeasonData.gameweek_stats), following the same rules
+as FPL.next_gameweek.
+"""
+
+from collections import namedtuple
+import numpy as np
+from season_data import load_season
+from game_rules import FPL, auto_substitutions
+
+
+SeasonResult = namedtuple("SeasonResult", ["points", "hits", "value", "total"])
+SeasonResult.__doc__ = """Result of simulate_season. points, hits and value
+are arrays of shape (squads, gameweeks), total has shape (squads,) and
+is the total points minus the transfer hits"""
+
+
+def squad_from_team(team):
+    """Convert a Team object to the squad arrays used by simulate_season
+
+    Returns:
+    --------
+    squad : ndarray
+        rows of the 15 players, ordered as team.players
+    bench : ndarray
+        positions of the 4 bench players in the squad, in bench order
+    captain : int
+        position of the captain in the squad
+    vice_captain : int
+        position of the vice captain in the squad
+    """
+    squad = team.squad
+    return np.array(squad.rows), np.array(squad.bench, dtype=int), squad.captain, squad.vice_captain
+
+
+def per_gameweek(array, squads, gameweeks, width=None):
+    """Broadcast an array given per squad to an array given per squad
+    and gameweek
+    """
+    array = np.asarray(array)
+    if width is None:
+        shape = (squads, gameweeks)
+        if array.ndim == 1:
+            array = array[:, None]
+    else:
+        shape = (squads, gameweeks, width)
+        if array.ndim == 2:
+            array = array[:, None, :]
+    return np.broadcast_to(array, shape)
+
+
+def count_transfers(new, old):
+    """Number of players in the new squads that are not in the old
+    squads. Both arrays have shape (squads, 15)
+    """
+    transfers = np.zeros(len(new), dtype=int)
+    changed = (new != old).any(axis=1)
+    new, old = new[changed], old[changed]
+    kept = (new[:, :, None] == old[:, None, :]).any(axis=2)
+    transfers[changed] = (~kept).sum(axis=1)
+    return transfers
+
+
+def transfer_hits(squads, chips):
+    """Compute the transfer hits of every squad and gameweek, with the
+    free transfers handled as in FPL.perform_actions and
+    FPL.next_gameweek. The squad of the first gameweek is the initial
+    team, and a free hit squad is reverted the following gameweek.
+
+    Parameters:
+    ----------
+    squads : ndarray
+        player rows of shape (squads, gameweeks, 15)
+    chips : ndarray
+        boolean array of shape (squads, gameweeks, 4)
+
+    Returns:
+    --------
+    hits : ndarray
+        points deducted, of shape (squads, gameweeks)
+    """
+    num_squads, num_gameweeks = squads.shape[:2]
+    wildcard = chips[:, :, 0]
+    free_hit = chips[:, :, 1]
+    unlimited = wildcard | free_hit
+
+    hits = np.zeros((num_squads, num_gameweeks), dtype=int)
+    free_transfers = np.ones(num_squads, dtype=int)
+    owned = squads[:, 0]
+    for gw in range(1, num_gameweeks):
+        # end of previous gameweek
+        free_transfers = free_transfers + 1
+        free_transfers[wildcard[:, gw-1]] = 1
+        free_transfers[free_hit[:, gw-1]] = 1
+        free_transfers = np.minimum(free_transfers, FPL.MAX_FREE_TRANSFERS)
+        owned = np.where(free_hit[:, gw-1, None], owned, squads[:, gw-1])
+
+        # transfers before this gameweek
+        transfers = count_transfers(squads[:, gw], owned)
+        transfers[unlimited[:, gw]] = 0
+        hits[:, gw] = FPL.TRANSFER_COST * np.maximum(0, transfers - free_transfers)
+        free_transfers = np.maximum(0, free_transfers - transfers)
+    return hits
+
+
+def score_squads(player_points, player_minutes, positions, bench, captain, vice_captain, chips):
+    """Points of squads from the points and minutes of their players,
+    with automatic substitutions, captaincy, triple captain and bench
+    boost.
+
+    Parameters:
+    ----------
+    player_points, player_minutes, positions : ndarray
+        arrays of shape (..., gameweeks, 15)
+    bench : ndarray
+        array of shape (..., gameweeks, 4)
+    captain, vice_captain : ndarray
+        arrays of shape (..., gameweeks, 1)
+    chips : ndarray
+        boolean array of shape (..., gameweeks, 4)
+
+    Returns:
+    --------
+    points : ndarray
+        array of shape (..., gameweeks)
+    """
+    starting = auto_substitutions(player_minutes, positions, bench)
+    counted = starting | chips[..., 3, None]
+    points = (player_points * counted).sum(axis=-1)
+
+    # captain points, or vice captain points if the captain does not play
+    played = counted & (player_minutes > 0)
+    captain_points = np.take_along_axis(player_points, captain, axis=-1)[..., 0]
+    vice_points = np.take_along_axis(player_points, vice_captain, axis=-1)[..., 0]
+    captain_plays = np.take_along_axis(played, captain, axis=-1)[..., 0]
+    vice_plays = np.take_along_axis(played, vice_captain, axis=-1)[..., 0]
+    bonus = np.where(captain_plays, captain_points, np.where(vice_plays, vice_points, 0))
+    return points + (1 + chips[..., 2]) * bonus
+
+
+def simulate_season(season, squads, bench, captain, vice_captain, chips=None,
+                    gameweeks=None, points=None, minutes=None, root=None):
+    """Simulate a season for many squads at once.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    squads : ndarray
+        player rows (see Player.get_player_row) of shape (squads, 15),
+        or (squads, gameweeks, 15) when transfers are made. Every squad
+        is ordered keepers, defenders, midfielders, forwards
+    bench : ndarray
+        positions of the bench players in the squads, in bench order,
+        of shape (squads, 4) or (squads, gameweeks, 4)
+    captain : ndarray
+        position of the captain in the squads, of shape (squads,) or
+        (squads, gameweeks)
+    vice_captain : ndarray
+        position of the vice captain, shaped as captain
+    chips : ndarray
+        boolean array of shape (squads, gameweeks, 4) telling which
+        chips are played, ordered as in FPL. No chips by default
+    gameweeks : int
+        number of gameweeks to simulate. All gameweeks by default
+    points : ndarray
+        points of every player row in gameweeks 1, 2, ..., of shape
+        (gameweeks, players), used instead of the points of the season,
+        for instance projected points
+    minutes : ndarray
+        minutes played, used instead of the minutes of the season,
+        shaped as points
+    root : str
+        data root. season_data.stats_dir by default
+
+    Returns:
+    --------
+    result : SeasonResult
+    """
+    data = load_season(season, root)
+    stats, stat_index = data.gameweek_stats()
+    if gameweeks is None:
+        gameweeks = min(FPL.GAMEWEEKS, stats.shape[0] - 1)
+
+    squads = np.asarray(squads)
+    num_squads = len(squads)
+    squads = per_gameweek(squads, num_squads, gameweeks, 15)
+    bench = per_gameweek(bench, num_squads, gameweeks, 4)
+    captain = per_gameweek(captain, num_squads, gameweeks)[:, :, None]
+    vice_captain = per_gameweek(vice_captain, num_squads, gameweeks)[:, :, None]
+    if chips is None:
+        chips = np.zeros((num_squads, gameweeks, 4), dtype=bool)
+    chips = np.asarray(chips, dtype=bool)
+
+    # gather the statistics of all players in one go
+    gw = np.arange(1, gameweeks + 1)[None, :, None]
+    stat = [stat_index['total_points'], stat_index['minutes'], stat_index['value']]
+    table = stats[:, :, stat]
+    if points is not None or minutes is not None:
+        table = np.array(table[:gameweeks + 1])
+        if points is not None:
+            table[1:, :, 0] = np.asarray(points)[:gameweeks]
+        if minutes is not None:
+            table[1:, :, 1] = np.asarray(minutes)[:gameweeks]
+    player_stats = table[gw, squads]
+    player_value = player_stats[..., 2]
+
+    positions = data.players_raw['element_type'].to_numpy()[squads]
+    squad_points = score_squads(player_stats[..., 0], player_stats[..., 1], positions,
+                                bench, captain, vice_captain, chips)
+    if points is None:
+        squad_points = squad_points.astype(int)
+    hits = transfer_hits(squads, chips)
+    value = player_value.sum(axis=2).astype(int)
+    total = squad_points.sum(axis=1) - hits.sum(axis=1)
+    return SeasonResult(squad_points, hits, value, total)
@@ -0,0 +1,119 @@
+"""
+Array-backed squad. The 15 player rows, the bench order and the
+captaincy of a squad are packed in small integer arrays, such that
+squads compare and hash cheaply and can be stacked into the batches
+taken by simulate_season.
+"""
+
+import numpy as np
+from season_data import load_season
+
+
+def canonical_order(rows, positions):
+    """Order of the squad rows sorted by position and row, such that
+    squads with the same players have the same canonical rows
+
+    Parameters:
+    ----------
+    rows : ndarray
+        rows of the 15 players
+    positions : ndarray
+        position id of every player row of the season
+    """
+    rows = np.asarray(rows)
+    return np.lexsort((rows, positions[rows]))
+
+
+class Squad:
+    """Immutable squad of a season.
+
+    Parameters:
+    ----------
+    season : str
+        season name ('2019-20' and so on)
+    rows : list
+        rows of the 15 players (see Player.get_player_row), ordered
+        keepers, defenders, midfielders, forwards
+    bench : list
+        positions of the 4 bench players in rows, in bench order
+    captain : int
+        position of the captain in rows
+    vice_captain : int
+        position of the vice captain in rows
+    """
+    __slots__ = ("season", "rows", "bench", "captain", "vice_captain", "_hash")
+
+    def __init__(self, season, rows, bench, captain, vice_captain):
+        self.season = season
+        self.rows = np.array(rows, dtype=np.int32)
+        self.bench = np.array(bench, dtype=np.int8)
+        assert self.rows.shape == (15,), "Exactly 15 players required!"
+        assert self.bench.shape == (4,), "4 players have to be on the bench!"
+        self.rows.flags.writeable = False
+        self.bench.flags.writeable = False
+        self.captain = int(captain)
+        self.vice_captain = int(vice_captain)
+        self._hash = None
+
+    def __eq__(self, other):
+        if not isinstance(other, Squad):
+            return NotImplemented
+        return (self.season == other.season and self.captain == other.captain
+                and self.vice_captain == other.vice_captain
+                and np.array_equal(self.rows, other.rows) and np.array_equal(self.bench, other.bench))
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.season, self.rows.tobytes(), self.bench.tobytes(),
+                               self.captain, self.vice_captain))
+        return self._hash
+
+    def __repr__(self):
+        return (f"Squad({self.season!r}, {self.rows.tolist()}, {self.bench.tolist()}, "
+                f"{self.captain}, {self.vice_captain})")
+
+    @property
+    def starting(self):
+        """Mask of the 11 starting players
+        """
+        starting = np.ones(15, dtype=bool)
+        starting[self.bench] = False
+        return starting
+
+    def positions(self):
+        """Position ids of the players
+        """
+        return load_season(self.season).position_ids[self.rows]
+
+    def transfer(self, slot, row):
+        """Get the squad where the player in slot is replaced by the
+        player of row, keeping the bench and captaincy
+        """
+        rows = self.rows.copy()
+        rows[slot] = row
+        return Squad(self.season, rows, self.bench, self.captain, self.vice_captain)
+
+    def canonical(self):
+        """Get the equal squad with the players of each position sorted
+        by row, such that squads with the same players, bench and
+        captains compare equal
+        """
+        order = canonical_order(self.rows, load_season(self.season).position_ids)
+        slots = np.argsort(order)
+        return Squad(self.season, self.rows[order], slots[self.bench],
+                     slots[self.captain], slots[self.vice_captain])
+
+    @staticmethod
+    def stack(squads):
+        """Stack squads into the arrays taken by simulate_season
+
+        Returns:
+        --------
+        rows, bench, captain, vice_captain : ndarray
+            arrays of shapes (squads, 15), (squads, 4), (squads,) and
+            (squads,)
+        """
+        return (np.stack([squad.rows for squad in squads]),
+                np.stack([squad.bench for squad in squads]).astype(int),
+                np.array([squad.captain for squad in squads]),
+                np.array([squad.vice_captain for squad in squads]))
@@ -0,0 +1,412 @@
+"""
+Exact squad optimizer. Picks the squad, starting eleven and captain
+with the most expected points under the FPL composition, budget and
+club rules. The MILP solver of SciPy is used when SciPy is installed.
+Otherwise the optimum is found by a dynamic program over the budget,
+with branch and bound on the club rule.
+"""
+
+import heapq
+from collections import namedtuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from game_rules import VALID_BENCH_COUNTS, MAX_PLAYERS_PER_CLUB
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    milp = None
+
+
+# number of keepers, defenders, midfielders and forwards in a squad
+COMPOSITION = (2, 5, 5, 3)
+
+OptimalSquad = namedtuple("OptimalSquad", ["squad", "bench", "captain", "vice_captain", "points", "cost"])
+OptimalSquad.__doc__ = """Result of optimize_squad. squad holds the indices of
+the 15 players ordered keepers, defenders, midfielders, forwards, and
+bench, captain and vice_captain are positions in squad, as in
+simulate_season. points is the expected points of the starting eleven
+with the captain counted twice (plus the weighted bench points)"""
+
+
+def starting_counts(composition=COMPOSITION):
+    """List the accepted numbers of starting keepers, defenders,
+    midfielders and forwards, see VALID_BENCH_COUNTS
+    """
+    counts = set()
+    for bench in VALID_BENCH_COUNTS:
+        starting = tuple(np.array(composition) - np.array(bench[1:]))
+        if min(starting) >= 0:
+            counts.add(starting)
+    return sorted(counts)
+
+
+def optimize_squad(points, prices, positions, clubs, budget=1000, composition=COMPOSITION,
+                   bench_weight=0.0, max_per_club=MAX_PLAYERS_PER_CLUB, solver=None):
+    """Find the squad with the most expected points.
+
+    The starting players score their expected points, the captain
+    twice, and the bench players bench_weight times their expected
+    points.
+
+    Parameters:
+    ----------
+    points : ndarray
+        expected points of every player
+    prices : ndarray
+        integer prices of every player (in units of 100k, as now_cost).
+        Players with price 0 are never picked
+    positions : ndarray
+        position ids (1-4) of every player
+    clubs : ndarray
+        club ids of every player
+    budget : int
+        maximum total price of the squad
+    composition : tuple
+        number of players of each position in the squad
+    bench_weight : float
+        weight of the expected points of the bench players
+    max_per_club : int
+        maximum number of players from each club
+    solver : str
+        'milp' (needs SciPy) or 'dp'. 'milp' when SciPy is installed
+        by default
+
+    Returns:
+    --------
+    squad : OptimalSquad
+    """
+    points = np.asarray(points, dtype=float)
+    prices = np.asarray(prices, dtype=int)
+    positions = np.asarray(positions, dtype=int)
+    clubs = np.asarray(clubs)
+    if solver is None:
+        solver = "dp" if milp is None else "milp"
+    if solver == "milp":
+        squad, starting, captain = solve_milp(points, prices, positions, clubs, budget,
+                                              composition, bench_weight, max_per_club)
+    else:
+        squad, starting, captain = solve_dp(points, prices, positions, clubs, budget,
+                                            composition, bench_weight, max_per_club)
+    return make_squad(points, prices, positions, squad, starting, captain, bench_weight)
+
+
+def make_squad(points, prices, positions, squad, starting, captain, bench_weight):
+    """Order a solution as an OptimalSquad. The bench keeper comes
+    first on the bench, followed by the outfield players with the most
+    expected points
+    """
+    order = np.lexsort((-points[squad], positions[squad]))
+    squad, starting = squad[order], starting[order]
+    bench = np.flatnonzero(~starting)
+    bench = bench[np.lexsort((-points[squad[bench]], positions[squad[bench]] != 1))]
+    captain = int(np.flatnonzero(squad == captain)[0])
+    others = np.flatnonzero(starting & (np.arange(len(squad)) != captain))
+    vice_captain = int(others[np.argmax(points[squad[others]])])
+    total = (points[squad[starting]].sum() + points[squad[captain]]
+             + bench_weight * points[squad[~starting]].sum())
+    return OptimalSquad(squad, bench, captain, vice_captain, float(total), int(prices[squad].sum()))
+
+
+def solve_milp(points, prices, positions, clubs, budget, composition, bench_weight, max_per_club):
+    """Solve the squad problem as a mixed integer linear program, with
+    binary variables for the squad, the starting players, the captain
+    and the formation
+    """
+    # only players that can be in an optimal squad get variables
+    players = np.concatenate([
+        candidates(points, prices, clubs, np.flatnonzero((prices > 0) & (positions == k + 1)),
+                   size, max_per_club)
+        for k, size in enumerate(composition)])
+    points, prices, positions, clubs = points[players], prices[players], positions[players], clubs[players]
+
+    n = len(points)
+    formations = starting_counts(composition)
+    num_vars = 3 * n + len(formations)
+    squad = np.arange(n)
+    start = n + squad
+    capt = 2 * n + squad
+    form = 3 * n + np.arange(len(formations))
+
+    cost = np.zeros(num_vars)
+    cost[squad] = -bench_weight * points
+    cost[start] = -(1 - bench_weight) * points
+    cost[capt] = -points
+
+    rows, lower, upper = [], [], []
+
+    def add(coefficients, lb, ub):
+        row = np.zeros(num_vars)
+        for index, value in coefficients:
+            row[index] = value
+        rows.append(row)
+        lower.append(lb)
+        upper.append(ub)
+
+    for i in range(n):
+        add([(start[i], 1), (squad[i], -1)], -np.inf, 0)
+        add([(capt[i], 1), (start[i], -1)], -np.inf, 0)
+    add([(capt, 1)], 1, 1)
+    add([(form, 1)], 1, 1)
+    add([(squad, prices)], -np.inf, budget)
+    for club in np.unique(clubs):
+        add([(squad[clubs == club], 1)], -np.inf, max_per_club)
+    for k, size in enumerate(composition):
+        position = positions == k + 1
+        add([(squad[position], 1)], size, size)
+        counts = np.array([formation[k] for formation in formations])
+        add([(start[position], 1), (form, -counts)], 0, 0)
+
+    result = milp(cost, integrality=np.ones(num_vars), bounds=Bounds(0, 1),
+                  constraints=LinearConstraint(np.array(rows), lower, upper))
+    assert result.x is not None, "No squad satisfies the rules!"
+    x = result.x > 0.5
+    selected = np.flatnonzero(x[squad])
+    return players[selected], x[start][selected], int(players[np.flatnonzero(x[capt])[0]])
+
+
+def solve_dp(points, prices, positions, clubs, budget, composition, bench_weight, max_per_club):
+    """Solve the squad problem without the club rule by dynamic
+    programming (see relaxed_squad), and enforce the club rule by
+    best-first branch and bound. When the players S[0], S[1], ... of a
+    club exceed the limit, the branches are: S[0] excluded; S[0]
+    included and S[1] excluded; and so on, and last S[:max_per_club]
+    included with all other players of the club excluded
+    """
+    # prices are often multiples of 5, which shrinks the tables
+    divisor = np.gcd.reduce(np.append(prices[prices > 0], budget))
+    prices, budget = prices // divisor, budget // divisor
+    args = (points, prices, positions, clubs, budget, composition, bench_weight, max_per_club)
+
+    cache = {}
+    node = (frozenset(), frozenset())
+    heap = []
+    solution = relaxed_squad(*args, *node, cache)
+    counter = 0
+    if solution is not None:
+        heap.append((-solution[0], counter, node, solution))
+    while heap:
+        _, _, (excluded, included), (value, squad, starting, captain) = heapq.heappop(heap)
+        club_ids, counts = np.unique(clubs[squad], return_counts=True)
+        if counts.max() <= max_per_club:
+            return squad, starting, captain
+        club = club_ids[np.argmax(counts)]
+        players = squad[clubs[squad] == club]
+        # included players first, such that no branch excludes them
+        players = sorted(players, key=lambda player: (player not in included, -points[player]))
+        branches = []
+        for i in range(max_per_club):
+            branches.append((excluded | {players[i]}, included | set(players[:i])))
+        others = set(np.flatnonzero(clubs == club)) - set(players[:max_per_club])
+        branches.append((excluded | others, included | set(players[:max_per_club])))
+        for branch in branches:
+            if branch[0] & branch[1]:
+                continue
+            branch = (frozenset(map(int, branch[0])), frozenset(map(int, branch[1])))
+            solution = relaxed_squad(*args, *branch, cache)
+            if solution is not None:
+                counter += 1
+                heapq.heappush(heap, (-solution[0], counter, branch, solution))
+    raise AssertionError("No squad satisfies the rules!")
+
+
+def candidates(points, prices, clubs, players, size, max_per_club, included=()):
+    """Remove the players of a position that can never be in an optimal
+    squad. A player is dominated by players at most as expensive with
+    at least as many points. A swap with such a player is blocked only
+    when the player is already picked, or when his club is full, which
+    with 14 other squad players can be true for at most 14 //
+    max_per_club clubs. So a player dominated by players from
+    size + 14 // max_per_club distinct clubs can be removed. Players in
+    included are always kept
+    """
+    p, v = prices[players], points[players]
+    order = np.arange(len(players))
+    dominates = ((p[:, None] <= p[None, :]) & (v[:, None] >= v[None, :])
+                 & ((p[:, None] < p[None, :]) | (v[:, None] > v[None, :])
+                    | (order[:, None] < order[None, :])))
+    needed = size + 14 // max_per_club
+    keep = []
+    for j in range(len(players)):
+        if players[j] in included or len(np.unique(clubs[players[dominates[:, j]]])) < needed:
+            keep.append(players[j])
+    return np.array(keep, dtype=int)
+
+
+def position_table(points, prices, players, size, budget, bench_weight, included=()):
+    """Knapsack table of one position. table[s, q, c, b] is the most
+    points of s starting and q bench players of total price b, where c
+    tells if the captain is among them. The decisions (0 left out,
+    1 starting, 2 captain, 3 bench) are kept for backtracking. The
+    players in included cannot be left out
+    """
+    width = budget + 1
+    table = np.full((size + 1, size + 1, 2, width), -np.inf)
+    table[0, 0, 0, 0] = 0
+    decisions = []
+    for player in players:
+        price, value = prices[player], points[player]
+        if player in included:
+            new = np.full(table.shape, -np.inf)
+        else:
+            new = table.copy()
+        decision = np.zeros(table.shape, dtype=np.int8)
+        # only states with fewer than size players can take a player,
+        # and none when the player is above the budget
+        old = table[:-1, :-1, :, :max(width - price, 0)]
+        updates = [(1, np.s_[1:, :-1, :, price:], old + value),
+                   (2, np.s_[1:, :-1, 1, price:], old[:, :, 0] + 2 * value),
+                   (3, np.s_[:-1, 1:, :, price:], old + bench_weight * value)]
+        for choice, index, candidate in updates:
+            better = candidate > new[index]
+            new[index] = np.where(better, candidate, new[index])
+            decision[index][better] = choice
+        table = new
+        decisions.append(decision)
+    return table, decisions
+
+
+def backtrack(prices, players, decisions, size, starting, captain, cost):
+    """Recover the players of a position from the knapsack decisions
+    """
+    bench = size - starting
+    picked, picked_starting, picked_captain = [], [], None
+    for player, decision in zip(players[::-1], decisions[::-1]):
+        choice = decision[starting, bench, captain, cost]
+        if choice == 0:
+            continue
+        picked.append(player)
+        cost -= prices[player]
+        if choice == 3:
+            bench -= 1
+            picked_starting.append(False)
+        else:
+            starting -= 1
+            picked_starting.append(True)
+            if choice == 2:
+                captain = 0
+                picked_captain = player
+    return picked, picked_starting, picked_captain
+
+
+def max_plus(a, b, high):
+    """Max-plus convolution of two arrays indexed by price:
+    value[t] = max over u of a[u] + b[t - u], computed for t <= high
+
+    Returns:
+    --------
+    value : ndarray
+    split : ndarray
+        the maximizing u for every t
+    """
+    width = len(a)
+    value = np.full(width, -np.inf)
+    split = np.zeros(width, dtype=int)
+    used = np.flatnonzero(np.isfinite(a[:high + 1]))
+    finite_b = np.flatnonzero(np.isfinite(b))
+    if len(used) == 0 or len(finite_b) == 0 or used[0] + finite_b[0] > high:
+        return value, split
+    low = used[0] + finite_b[0]
+    padded = np.concatenate([np.full(width - 1, -np.inf), b])
+    # shifted[t - low, j] = b[t - used[j]]
+    shifted = sliding_window_view(padded, width)[low:high + 1, width - 1 - used]
+    total = shifted + a[used]
+    best = total.argmax(axis=1)
+    value[low:high + 1] = total[np.arange(len(total)), best]
+    split[low:high + 1] = used[best]
+    return value, split
+
+
+def relaxed_squad(points, prices, positions, clubs, budget, composition, bench_weight,
+                  max_per_club, excluded, included, cache):
+    """Best squad ignoring the club rule, among the players not in
+    excluded and with all players in included. None is returned if no
+    such squad fits the budget. The position tables and their merges
+    are cached in cache
+
+    Returns:
+    --------
+    value : float
+    squad : ndarray
+        player indices
+    starting : ndarray
+        True for the starting players of squad
+    captain : int
+        player index of the captain
+    """
+    excluded = np.array(sorted(excluded), dtype=int)
+    included = np.array(sorted(included), dtype=int)
+    # a position can spend at most the budget minus the cheapest
+    # possible price of the other positions
+    cheapest = np.array([np.sort(prices[(prices > 0) & (positions == k + 1)])[:size].sum()
+                         for k, size in enumerate(composition)])
+    if cheapest.sum() > budget:
+        return None
+    tables = []
+    table_keys = []
+    for k, size in enumerate(composition):
+        key = (k, tuple(excluded[positions[excluded] == k + 1]),
+               tuple(included[positions[included] == k + 1]))
+        if key not in cache:
+            allowed = (prices > 0) & (positions == k + 1)
+            allowed[excluded] = False
+            forced = set(key[2])
+            players = candidates(points, prices, clubs, np.flatnonzero(allowed), size,
+                                 max_per_club, forced)
+            limit = budget - cheapest.sum() + cheapest[k]
+            table, decisions = position_table(points, prices, players, size, limit,
+                                              bench_weight, forced)
+            # exactly size players of the position
+            exact = np.full((size + 1, 2, budget + 1), -np.inf)
+            for s in range(size + 1):
+                exact[s, :, :limit + 1] = table[s, size - s]
+            cache[key] = (players, decisions, exact)
+        tables.append(cache[key])
+        table_keys.append(key)
+
+    # merge all positions but the last one by max-plus convolutions,
+    # reusing common prefixes, and add the best last position within
+    # the remaining budget
+    last = len(composition) - 1
+    best_last = np.maximum.accumulate(tables[last][2], axis=-1)
+    high = budget - np.cumsum(cheapest[::-1])[::-1] + cheapest
+    best = None
+    for formation in starting_counts(composition):
+        for captain_position in range(len(composition)):
+            flags = tuple(int(k == captain_position) for k in range(len(composition)))
+            key = ()
+            for k in range(last):
+                key = key + ((table_keys[k], formation[k], flags[k]),)
+                if key not in cache:
+                    array = tables[k][2][formation[k], flags[k]]
+                    if k == 0:
+                        cache[key] = (array, None)
+                    else:
+                        cache[key] = max_plus(cache[key[:-1]][0], array, high[k])
+            total = cache[key][0] + best_last[formation[last], flags[last]][::-1]
+            cost = int(np.argmax(total))
+            if np.isfinite(total[cost]) and (best is None or total[cost] > best[0]):
+                best = (total[cost], formation, flags, cost, key)
+    if best is None:
+        return None
+
+    # split the budget between the positions, from the last position back
+    value, formation, flags, cost, key = best
+    last_table = tables[last][2][formation[last], flags[last]]
+    costs = [int(np.argmax(last_table[:budget - cost + 1]))]
+    for k in reversed(range(1, last)):
+        split = cache[key[:k + 1]][1][cost]
+        costs.append(cost - split)
+        cost = split
+    costs.append(cost)
+
+    squad, starting, captain = [], [], None
+    for k, position_cost in zip(reversed(range(len(composition))), costs):
+        players, decisions, _ = tables[k]
+        picked, picked_starting, picked_captain = backtrack(
+            prices, players, decisions, composition[k], formation[k], flags[k], position_cost)
+        squad += picked
+        starting += picked_starting
+        if picked_captain is not None:
+            captain = picked_captain
+    return value, np.array(squad), np.array(starting), captain
@@ -3,7 +3,15 @@ Team base class
 """
 
 #from player_information import PlayerStats
+import logging
+import numpy as np
 from players import Player
+from squad import Squad
+from season_data import load_season
+from profiling import timed
+from game_rules import auto_substitutions
+
+logger = logging.getLogger(__name__)
 
 class Team:
     """Football team class. Contains information about
@@ -12,6 +20,10 @@ class Team:
         - Captain
         - Vice captain
 
+    The team is a thin wrapper over a Squad (see squad.py), which holds
+    the player rows, bench and captaincy. The player lists are derived
+    from the squad.
+
     Parameters:
     ----------
     players : list
@@ -39,24 +51,99 @@ class Team:
         #    for i in len(position):
         #        if isinstance(position[i], str):
         #            position[i] = Player(position[i])
-                    
-        self.keepers = keepers
-        self.defenders = defenders
-        self.midfielders = midfielders
-        self.forwards = forwards
-
-        self.players = keepers + defenders + midfielders + forwards
-        self.positions = [keepers, defenders, midfielders, forwards]
-        self.out_players = list(set(self.players) - set(bench))
-        
-        self.bench = bench
-        self.captain = captain
-        self.vice_captain = vice_captain
+
+        self._players = keepers + defenders + midfielders + forwards
 
         self.check_player_existence()
         self.check_player_duplicate()
-        self.check_players_on_bench()
-        self.check_captains()
+        self.check_players_on_bench(bench)
+        self.check_captains(captain, vice_captain)
+
+        players = self._players
+        self.squad = Squad(season, [player.get_player_row(season) for player in players],
+                           [players.index(player) for player in bench],
+                           players.index(captain), players.index(vice_captain))
+
+    @classmethod
+    def from_squad(cls, squad, players=None):
+        """Create the team of a Squad. The squad is not checked again,
+        so it should come from a checked team or SquadState.
+
+        Parameters:
+        ----------
+        squad : Squad
+            the squad
+        players : dict
+            Player objects by row to reuse, for instance the players of
+            the team the squad was transferred from
+        """
+        team = cls.__new__(cls)
+        team.season = squad.season
+        team.squad = squad
+        # the Player objects are created when first needed
+        team._players = None
+        team._known = {} if players is None else players
+        return team
+
+    def with_squad(self, squad):
+        """Get the team of a squad of the same season, such as
+        self.squad.transfer(slot, row), reusing the Player objects of
+        the players kept
+        """
+        if self._players is None:
+            return Team.from_squad(squad, self._known)
+        return Team.from_squad(squad, dict(zip(self.squad.rows.tolist(), self._players)))
+
+    @property
+    def players(self):
+        """The 15 players, ordered keepers, defenders, midfielders,
+        forwards as squad.rows
+        """
+        if self._players is None:
+            known = self._known
+            self._players = [known[row] if row in known else Player.from_row(self.season, row)
+                             for row in self.squad.rows.tolist()]
+        return self._players
+
+    @property
+    def keepers(self):
+        return self.players[:2]
+
+    @property
+    def defenders(self):
+        return self.players[2:7]
+
+    @property
+    def midfielders(self):
+        return self.players[7:12]
+
+    @property
+    def forwards(self):
+        return self.players[12:]
+
+    @property
+    def positions(self):
+        return [self.keepers, self.defenders, self.midfielders, self.forwards]
+
+    @property
+    def bench(self):
+        """The bench players, in bench order
+        """
+        return [self.players[slot] for slot in self.squad.bench.tolist()]
+
+    @property
+    def out_players(self):
+        """The starting players, in squad order
+        """
+        return [player for player, start in zip(self.players, self.squad.starting) if start]
+
+    @property
+    def captain(self):
+        return self.players[self.squad.captain]
+
+    @property
+    def vice_captain(self):
+        return self.players[self.squad.vice_captain]
 
     def __str__(self):
         """Display team nicely
@@ -74,28 +161,32 @@ class Team:
             for player in position:
                 position_id = player.get_player_position_id(self.season)
                 assert position_id == i, f"Position error for {player.name} ({names[position_id].lower()})"
-        print("All players exist")
+        logger.info("All players exist")
 
     def check_player_duplicate(self):
         """Check if the same player is picked two or more times
         """
         for position in self.positions:
             assert len(set(position)) == len(position), "Player duplicated"
-        print("No duplicates")
+        logger.info("No duplicates")
 
-    def check_players_on_bench(self):
+    def check_players_on_bench(self, bench=None):
         """Assert that all players on bench also are among the players
         """
-        for bench_player in self.bench:
+        if bench is None:
+            bench = self.bench
+        for bench_player in bench:
             assert bench_player in self.players, f"Bench player {bench_player} is not among the listed players"
-        print("All players on the bench are in the team")
+        logger.info("All players on the bench are in the team")
 
-    def check_captains(self):
+    def check_captains(self, captain=None, vice_captain=None):
         """Check is captain and vice captain are among players
         """
-        assert self.captain in self.players, "Captain not among selected players!"
-        assert self.vice_captain in self.players, "Vice captain not among selected players!"
-        print("Captains approved")
+        if captain is None:
+            captain, vice_captain = self.captain, self.vice_captain
+        assert captain in self.players, "Captain not among selected players!"
+        assert vice_captain in self.players, "Vice captain not among selected players!"
+        logger.info("Captains approved")
 
     def get_names(self):
         """Get player names
@@ -113,29 +204,32 @@ class Team:
             team_ids.append(player.get_team_id(self.season))
         return team_ids
 
+    def get_player_rows(self):
+        """Get the rows of all players in the season's statistics
+        """
+        return np.array(self.squad.rows)
+
+    def get_gameweek_stat(self, keyword, gameweek):
+        """Get a numeric gameweek statistic of all players, in the
+        same order as self.players
+        """
+        stats, stat_index = load_season(self.season).gameweek_stats()
+        return stats[gameweek, self.get_player_rows(), stat_index[keyword]]
+
     def get_team_cost(self, gameweek):
         """Get total player costs
         """
-        total_cost = 0
-        for player in self.players:
-            total_cost += player.get_gameweek_price(self.season, gameweek)
-        return total_cost
+        return self.get_team_cost_gameweek(gameweek)
 
     def get_team_cost_gameweek(self, gameweek):
         """Get total player price at a certain gameweek
         """
-        total_cost = 0
-        for player in self.players:
-            total_cost += player.get_gameweek_price(self.season, gameweek)
-        return total_cost
+        return int(self.get_gameweek_stat('value', gameweek).sum())
 
     def get_team_points_gameweek(self, gameweek):
         """Get total player points at a certain gameweek
         """
-        total_points = 0
-        for player in self.players:
-            total_points += player.get_gameweek_points(self.season, gameweek)
-        return total_points
+        return int(self.get_gameweek_stat('total_points', gameweek).sum())
 
     def get_positions(self):
         """Get player positions
@@ -155,60 +249,30 @@ class Team:
             customs.append(custom)
         return customs
 
+    @timed("Team.auto_substitute")
     def auto_substitute(self, gameweek):
-        """Auto substitute players with bench players.
-        The rule is to replace a player that did not
-        play with the first bench player (except the
-        goalkeeper). If possible, a player will be
-        substituted
-        """
-        # split bench in keeper and not keeper
-        bench_sorted = self.bench.copy()
-        for i, bench_player in enumerate(self.bench):
-            if bench_player.get_player_position_id(self.season) == 1:
-                bench_keeper = bench_player
-                bench_sorted.pop(i)
-                break
-        
-        one_player_substituted = False
-        #out_players = list(set(self.players) - set(self.bench))
-        for player in self.out_players:
-            if player.get_gameweek_minutes(self.season, gameweek) == 0:
-                if player.get_player_position_id(self.season) == 1:
-                    # check keeper
-                    #if keeper[0] == player:
-                    #    other_keeper = keeper[1]
-                    #else:
-                    #    other_keeper = keeper[0]
-                    if bench_keeper.get_gameweek_minutes(self.season, gameweek) != 0:
-                        bench_keeper = player
-                        one_player_substituted = True
-                        print("Keeper substituted")
-                        break
-                else:
-                    # check other players
-                    if bench_sorted[0].get_gameweek_minutes(self.season, gameweek) !=0:
-                        bench_sorted[0] = bench_sorted[1]
-                        bench_sorted[1] = bench_sorted[2]
-                        bench_sorted[2] = player
-                        one_player_substituted = True
-                        print(f"{bench_sorted[0].name} substituted for {player.name}")
-                        break
-                    elif bench_sorted[1].get_gameweek_minutes(self.season, gameweek) != 0:
-                        bench_sorted[1] = bench_sorted[2]
-                        bench_sorted[2] = player
-                        one_player_substituted = True
-                        print(f"{bench_sorted[1].name} substituted for {player.name}")
-                        break
-                    elif bench_sorted[2].get_gameweek_minutes(self.season, gameweek) != 0:
-                        bench_sorted[2] = player
-                        one_player_substituted = True
-                        print(f"{bench_sorted[2].name} substituted for {player.name}")
-                        break
-                    else:
-                        print("No player substituted")
-        self.bench = [bench_keeper] + bench_sorted
-        return one_player_substituted
+        """Auto substitute players with bench players. A starting
+        player that did not play is replaced by the first bench
+        player that played, as long as the formation stays valid
+        (see game_rules.auto_substitutions). The team itself is not
+        changed.
+
+        Returns:
+        --------
+        starting : ndarray
+            mask of the players in self.players that start after
+            the substitutions
+        """
+        minutes = self.get_gameweek_stat('minutes', gameweek)
+        starting = auto_substitutions(minutes, self.squad.positions(), self.squad.bench)
+
+        if logger.isEnabledFor(logging.INFO):
+            default = self.squad.starting
+            subs_in = [player.name for player, start, out in zip(self.players, starting, default) if start and not out]
+            subs_out = [player.name for player, start, out in zip(self.players, starting, default) if out and not start]
+            if subs_in:
+                logger.info("%s substituted for %s", ", ".join(subs_in), ", ".join(subs_out))
+        return starting
 
 
 if __name__ == "__main__":
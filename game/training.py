@@ -0,0 +1,160 @@
+"""
+Mini-batch training loop shared by the models of TrainingSet and
+InitialRound, with a validation split, early stopping and periodic
+checkpoints.
+"""
+
+import copy
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset, IterableDataset
+
+logger = logging.getLogger(__name__)
+
+
+def to_tensor(array):
+    """Convert an array to a float32 tensor, without copying when it
+    already is one
+    """
+    if isinstance(array, torch.Tensor):
+        return array.float()
+    return torch.as_tensor(np.asarray(array, dtype=np.float32))
+
+
+def train_model(model, x, t, lr, epochs, batch_size=256, validation=0.1, patience=10,
+                checkpoint=None, checkpoint_every=10, log_every=10, workers=0,
+                pin_memory=False, device="cpu", seed=0):
+    """Train a model with the Adam optimizer on the mean squared error.
+
+    Parameters:
+    ----------
+    model : nn.Module
+        the model to train
+    x : ndarray or Dataset
+        inputs of shape (samples, features). Can also be an
+        IterableDataset of (x, t) batches, such as StreamingTrainingSet,
+        in which case t and batch_size are ignored (the batches are the
+        chunks of the dataset) and validation has to be a tuple or None
+    t : ndarray
+        targets of shape (samples, 1)
+    lr : float
+        learning rate
+    epochs : int
+        maximum number of passes over the training set
+    batch_size : int
+        number of samples per gradient step, for array inputs
+    validation : float or tuple
+        fraction of the samples held out for early stopping, or
+        (x, t) of a separate validation set. None disables validation
+        and early stopping. Only a tuple or None is accepted for an
+        IterableDataset, which cannot be split
+    patience : int
+        stop after this many epochs without improvement of the
+        validation loss. The best weights are restored at the end
+    checkpoint : str
+        file where the model and optimizer states are saved every
+        checkpoint_every epochs
+    log_every : int
+        log the losses every log_every epochs
+    workers : int
+        number of DataLoader worker processes. The tensors are moved
+        to shared memory when workers are used
+    pin_memory : bool
+        pin the batches in page-locked memory, for faster copies to GPU
+    device : str
+        device to train on
+    seed : int
+        seed of the validation split and the shuffling
+
+    Returns:
+    --------
+    history : list
+        (epoch, training loss, validation loss) of every epoch
+    """
+    generator = torch.Generator().manual_seed(seed)
+    model.to(device)
+    x_val = t_val = None
+    if isinstance(x, IterableDataset):
+        if validation is not None and not isinstance(validation, tuple):
+            raise ValueError("An IterableDataset cannot be split, give validation as an (x, t) "
+                             "tuple, or None to train without validation")
+        loader = DataLoader(x, batch_size=None, num_workers=workers, pin_memory=pin_memory)
+        if validation is not None:
+            x_val, t_val = map(to_tensor, validation)
+    else:
+        x, t = to_tensor(x), to_tensor(t)
+        if isinstance(validation, tuple):
+            x_val, t_val = map(to_tensor, validation)
+        elif validation:
+            permutation = torch.randperm(len(x), generator=generator)
+            num_val = int(validation * len(x))
+            x_val, t_val = x[permutation[:num_val]], t[permutation[:num_val]]
+            x, t = x[permutation[num_val:]], t[permutation[num_val:]]
+        if workers:
+            x.share_memory_()
+            t.share_memory_()
+        loader = DataLoader(TensorDataset(x, t), batch_size=batch_size, shuffle=True,
+                            num_workers=workers, pin_memory=pin_memory, generator=generator)
+
+    loss_func = nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    best_loss = np.inf
+    best_state = None
+    bad_epochs = 0
+    history = []
+    for epoch in range(epochs):
+        model.train()
+        total_loss = 0
+        samples = 0
+        for x_batch, t_batch in loader:
+            x_batch = x_batch.to(device, non_blocking=pin_memory)
+            t_batch = t_batch.to(device, non_blocking=pin_memory)
+            loss = loss_func(model(x_batch), t_batch)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(x_batch)
+            samples += len(x_batch)
+        train_loss = total_loss / max(samples, 1)
+
+        val_loss = None
+        if x_val is not None:
+            model.eval()
+            with torch.no_grad():
+                val_loss = loss_func(model(x_val.to(device)), t_val.to(device)).item()
+            if val_loss < best_loss:
+                best_loss = val_loss
+                best_state = copy.deepcopy(model.state_dict())
+                bad_epochs = 0
+            else:
+                bad_epochs += 1
+        history.append((epoch, train_loss, val_loss))
+
+        if log_every and (epoch % log_every == 0 or epoch == epochs - 1):
+            if val_loss is None:
+                logger.info("epoch: %d loss: %.4f", epoch, train_loss)
+            else:
+                logger.info("epoch: %d loss: %.4f validation loss: %.4f", epoch, train_loss, val_loss)
+        if checkpoint is not None and (epoch + 1) % checkpoint_every == 0:
+            torch.save({"epoch": epoch, "model": model.state_dict(),
+                        "optimizer": optimizer.state_dict(), "history": history}, checkpoint)
+        if patience is not None and bad_epochs >= patience:
+            logger.info("Early stopping after epoch %d, best validation loss: %.4f", epoch, best_loss)
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    return history
+
+
+def load_checkpoint(model, checkpoint, optimizer=None):
+    """Load the states saved by train_model into a model (and
+    optimizer). Returns the epoch of the checkpoint
+    """
+    state = torch.load(checkpoint)
+    model.load_state_dict(state["model"])
+    if optimizer is not None:
+        optimizer.load_state_dict(state["optimizer"])
+    return state["epoch"]
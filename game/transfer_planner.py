@@ -0,0 +1,244 @@
+"""
+Multi-gameweek transfer planner. Given the expected points of every
+player for the next gameweeks, a beam search over (squad, bank, free
+transfers) states finds the sequence of transfers, hits included, with
+the most expected points. States reached by different transfer orders
+are merged, and the lineup value of a squad is computed once per
+gameweek.
+"""
+
+import time
+from collections import namedtuple
+import numpy as np
+from game_rules import FPL, SquadState, MAX_PLAYERS_PER_CLUB
+from squad_optimizer import COMPOSITION, starting_counts
+from squad import Squad, canonical_order
+
+
+TransferPlan = namedtuple("TransferPlan", ["transfers", "squads", "points", "hits", "total"])
+TransferPlan.__doc__ = """Result of plan_transfers. transfers holds a list of
+(player out, player in) rows for every gameweek, squads the rows of the
+squad played in every gameweek, points the expected points of the best
+lineup (captain included) and hits the transfer hits of every gameweek.
+total is the sum of points minus the sum of hits"""
+
+
+def lineup_points(points, squads):
+    """Expected points of the best starting eleven of squads, with the
+    captain counted twice. The best player is always in the best
+    eleven, since every formation starts at least one player of each
+    position.
+
+    Parameters:
+    ----------
+    points : ndarray
+        expected points of shape (gameweeks, players)
+    squads : ndarray
+        player rows of shape (squads, 15), ordered as Squad.canonical
+
+    Returns:
+    --------
+    lineup : ndarray
+        array of shape (gameweeks, squads)
+    """
+    squad_points = points[:, squads]
+    offsets = np.cumsum((0,) + COMPOSITION)
+    best = np.full(squad_points.shape[:2], -np.inf)
+    sums = []
+    for k in range(len(COMPOSITION)):
+        group = -np.sort(-squad_points[..., offsets[k]:offsets[k+1]], axis=-1)
+        sums.append(np.cumsum(group, axis=-1))
+    for formation in starting_counts():
+        value = sum(sums[k][..., count - 1] for k, count in enumerate(formation) if count)
+        best = np.maximum(best, value)
+    return best + squad_points.max(axis=-1)
+
+
+class TransferPlanner:
+    """Beam search over transfer sequences.
+
+    Parameters:
+    ----------
+    expected_points : ndarray
+        expected points of every player (row) in each of the next
+        gameweeks, of shape (horizon, players)
+    prices : ndarray
+        price of every player
+    positions : ndarray
+        position id of every player
+    clubs : ndarray
+        club id of every player
+    budget : int
+        maximum total cost of the squad
+    max_transfers : int
+        maximum number of transfers per gameweek
+    beam_width : int
+        number of states kept after every gameweek
+    candidates : int
+        number of players per position considered for buying, picked
+        by their expected points over the horizon
+    branching : int
+        number of single transfers of a state extended to a second
+        transfer, and so on
+    """
+    def __init__(self, expected_points, prices, positions, clubs, budget=1000, max_transfers=2,
+                 beam_width=50, candidates=10, branching=10):
+        self.expected_points = np.asarray(expected_points, dtype=float)
+        self.prices = np.rint(prices).astype(int)
+        self.positions = np.asarray(positions)
+        self.clubs = np.asarray(clubs)
+        self.budget = budget
+        self.max_transfers = max_transfers
+        self.beam_width = beam_width
+        self.branching = branching
+        self.horizon = len(self.expected_points)
+        self.lineups = {}
+
+        # players worth buying, per position
+        total = self.expected_points.sum(axis=0)
+        self.pool = {}
+        for position in range(1, len(COMPOSITION) + 1):
+            players = np.flatnonzero((self.positions == position) & (self.prices > 0))
+            self.pool[position] = players[np.argsort(-total[players], kind="stable")[:candidates]]
+
+        # all (slot, player in) pairs of a canonical squad
+        self.offsets = np.cumsum((0,) + COMPOSITION)
+        slot_positions = np.repeat(np.arange(1, len(COMPOSITION) + 1), COMPOSITION)
+        self.slots = np.concatenate([np.full(len(self.pool[position]), slot)
+                                     for slot, position in enumerate(slot_positions)]).astype(int)
+        self.buys = np.concatenate([self.pool[position] for position in slot_positions]).astype(int)
+
+    def lineup(self, squads, gameweek):
+        """Lineup points of squads in the gameweeks from gameweek to
+        the horizon, memoized per squad. Returns an array of shape
+        (squads, gameweeks left)
+        """
+        missing = [squad for squad in squads if squad not in self.lineups]
+        if missing:
+            values = lineup_points(self.expected_points, np.array(missing))
+            for squad, value in zip(missing, values.T):
+                self.lineups[squad] = value
+        return np.array([self.lineups[squad][gameweek:] for squad in squads]).reshape(len(squads), -1)
+
+    def transfers(self, squad, bank):
+        """All legal single transfers from a squad at once
+
+        Returns:
+        --------
+        moves : list
+            (out, in, new squad, new bank) of every legal transfer
+        """
+        rows = np.array(squad)
+        old = rows[self.slots]
+        new = self.buys
+        new_bank = bank + self.prices[old] - self.prices[new]
+        club_counts = np.bincount(self.clubs[rows], minlength=self.clubs.max() + 1)
+        legal = ~np.isin(new, rows) & (new_bank >= 0)
+        legal &= club_counts[self.clubs[new]] - (self.clubs[old] == self.clubs[new]) < MAX_PLAYERS_PER_CLUB
+
+        squads = np.repeat(rows[None], legal.sum(), axis=0)
+        squads[np.arange(len(squads)), self.slots[legal]] = new[legal]
+        # keep the canonical order within the position of the transfer
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            squads[:, start:end].sort(axis=1)
+        return list(zip(old[legal].tolist(), new[legal].tolist(),
+                        map(tuple, squads.tolist()), new_bank[legal].tolist()))
+
+    def plan(self, squad, free_transfers, bank=None, deadline=None):
+        """Find the best transfers for the horizon.
+
+        Parameters:
+        ----------
+        squad : Squad or list
+            the current squad, or the rows of its 15 players
+        free_transfers : int
+            free transfers available before the first gameweek
+        bank : int
+            money in the bank. By default budget minus the squad cost
+        deadline : float
+            seconds to search. When the time is up, the best plan so far
+            is completed without further transfers
+
+        Returns:
+        --------
+        plan : TransferPlan
+        """
+        start = time.monotonic()
+        if isinstance(squad, Squad):
+            rows = squad.canonical().rows
+        else:
+            rows = np.asarray(squad)[canonical_order(squad, self.positions)]
+        # the states are keyed by the canonical rows of their squads
+        squad = tuple(rows.tolist())
+        if bank is None:
+            bank = self.budget - self.prices[list(squad)].sum()
+        bank = int(round(bank))
+        # state: (squad, bank, free transfers) -> (score, transfers, squads, hits)
+        beam = {(squad, bank, free_transfers): (0.0, [], [], [])}
+        for gameweek in range(self.horizon):
+            children = {}
+            for (squad, bank, free), (score, transfers, squads, hits) in beam.items():
+                timed_out = deadline is not None and time.monotonic() - start > deadline
+                # expand 0, 1, 2, ... transfers, extending the best ones
+                level = [(squad, bank, [])]
+                for count in range(self.max_transfers + 1):
+                    if count and (timed_out or not level):
+                        break
+                    if count:
+                        moves = []
+                        for parent, parent_bank, made in level:
+                            for old, new, child, child_bank in self.transfers(parent, parent_bank):
+                                moves.append((child, child_bank, made + [(old, new)]))
+                        if not moves:
+                            break
+                        # keep the most promising moves of this level
+                        values = self.lineup([move[0] for move in moves], gameweek).sum(axis=1)
+                        order = np.argsort(-values, kind="stable")[:self.branching * len(level)]
+                        level = [moves[i] for i in order]
+                    hit = FPL.TRANSFER_COST * max(0, count - free)
+                    next_free = min(max(0, free - count) + 1, FPL.MAX_FREE_TRANSFERS)
+                    points = self.lineup([child for child, _, _ in level], gameweek)[:, 0]
+                    for (child, child_bank, made), child_points in zip(level, points):
+                        key = (child, child_bank, next_free)
+                        value = score - hit + child_points
+                        if key not in children or children[key][0] < value:
+                            children[key] = (value, transfers + [made], squads + [child], hits + [hit])
+
+            # rank by the points so far plus the points of keeping the squad
+            keys = list(children)
+            future = self.lineup([key[0] for key in keys], gameweek)[:, 1:].sum(axis=1)
+            scores = np.array([children[key][0] for key in keys]) + future
+            order = np.argsort(-scores, kind="stable")[:self.beam_width]
+            beam = {keys[i]: children[keys[i]] for i in order}
+
+        score, transfers, squads, hits = max(beam.values(), key=lambda entry: entry[0])
+        points = np.array([self.lineup([squad], gameweek)[0, 0]
+                           for gameweek, squad in enumerate(squads)])
+        return TransferPlan(transfers, [list(squad) for squad in squads], points,
+                            np.array(hits), float(points.sum() - sum(hits)))
+
+
+def plan_transfers(game, expected_points, deadline=None, **kwargs):
+    """Plan the transfers of an FPL game from its current gameweek.
+
+    Parameters:
+    ----------
+    game : FPL
+        the game, whose team, money bank and free transfers are used
+    expected_points : ndarray
+        expected points of every player row in the next gameweeks, of
+        shape (horizon, players)
+    deadline : float
+        seconds to search
+    kwargs :
+        options of TransferPlanner
+
+    Returns:
+    --------
+    plan : TransferPlan
+    """
+    state = SquadState.from_team(game.team, game.gameweek, game.money_bank)
+    planner = TransferPlanner(expected_points, state.prices, state.position_ids, state.club_ids,
+                              game.money_bank, **kwargs)
+    free_transfers = min(game.free_transfers, FPL.MAX_FREE_TRANSFERS)
+    return planner.plan(game.team.squad, free_transfers, game.money_bank - state.cost, deadline)